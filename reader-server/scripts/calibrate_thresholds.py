@@ -0,0 +1,297 @@
+"""Propose per-topic similarity thresholds from recorded similarity traces.
+
+A matched message opens a thread; the thread counts as a true match when
+the initiator replied to the bot's answer. Traced scores of matched
+messages are joined with these labels, and for every topic the threshold
+maximizing F-beta over its precision/recall curve is written to the
+thresholds file loaded by SentenceTransformerService.
+
+Every encoder has its own score scale, so traces are tagged with the stage
+that produced them and each stage is calibrated separately: ``main`` writes
+ai_model/topic_thresholds.json and ``cascade`` writes the small model's
+ai_model/<CASCADE_MODEL_DIR>/topic_thresholds.json. Both stages are traced
+while the cascade is enabled.
+
+Usage (from the reader-server root, with PYTHONPATH set to it):
+    python scripts/calibrate_thresholds.py --beta 0.5 --min-samples 30
+    python scripts/calibrate_thresholds.py --stage cascade --beta 1
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import func, select
+
+from src.core import settings
+from src.infrastructure.database import db_manager
+from src.infrastructure.database.models import Chat, Message, Thread
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+USER_SENDER_TYPE = "user"
+
+
+def load_traces(trace_dir: Path, stage: str) -> dict[str, np.ndarray]:
+    """Flatten one stage's traces into parallel arrays of (message, topic) scores."""
+    user_ids, chat_ids, message_ids, topic_ids, scores = [], [], [], [], []
+    for path in sorted(trace_dir.glob("similarity_*.jsonl")):
+        with path.open(encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                # Traces written before stages existed come from the main model
+                if entry.get("stage", "main") != stage:
+                    continue
+                count = len(entry["topic_ids"])
+                user_ids.append(np.full(count, entry["user_id"], dtype=np.int64))
+                chat_ids.append(np.full(count, entry["chat_id"], dtype=np.int64))
+                message_ids.append(
+                    np.full(count, entry["message_id"], dtype=np.int64),
+                )
+                topic_ids.append(np.asarray(entry["topic_ids"], dtype=np.int64))
+                scores.append(np.asarray(entry["scores"], dtype=np.float32))
+
+    if not scores:
+        return {}
+    return {
+        "user_id": np.concatenate(user_ids),
+        "chat_id": np.concatenate(chat_ids),
+        "message_id": np.concatenate(message_ids),
+        "topic_id": np.concatenate(topic_ids),
+        "score": np.concatenate(scores),
+    }
+
+
+async def load_labels() -> dict[str, np.ndarray]:
+    """Label every thread by whether its initiator replied to the bot."""
+    user_messages = (
+        select(
+            Message.thread_id,
+            func.min(Message.id).label("first_message_id"),
+            func.count(Message.id).label("num_user_messages"),
+        )
+        .where(Message.sender_type == USER_SENDER_TYPE)
+        .group_by(Message.thread_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Chat.user_id,
+            Chat.telegram_chat_id,
+            Message.telegram_message_id,
+            Thread.topic_id,
+            user_messages.c.num_user_messages,
+        )
+        .join(Thread, Thread.id == user_messages.c.thread_id)
+        .join(Chat, Chat.id == Thread.chat_id)
+        .join(Message, Message.id == user_messages.c.first_message_id)
+        .where(Thread.topic_id.is_not(None))
+    )
+
+    async for session in db_manager.get_session():
+        rows = (await session.execute(query)).all()
+        break
+    await db_manager.engine.dispose()
+
+    if not rows:
+        return {}
+    columns = np.array(rows, dtype=np.int64).T
+    return {
+        "user_id": columns[0],
+        "chat_id": columns[1],
+        "message_id": columns[2],
+        "topic_id": columns[3],
+        # The first user message opens the thread, later ones are replies
+        "label": columns[4] > 1,
+    }
+
+
+def join_labels(
+    traces: dict[str, np.ndarray],
+    labels: dict[str, np.ndarray],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return topic ids, scores and labels of traced pairs that have a thread."""
+    keys = ("user_id", "chat_id", "message_id", "topic_id")
+    label_keys = np.column_stack([labels[k] for k in keys])
+    trace_keys = np.column_stack([traces[k] for k in keys])
+
+    # Map both key sets onto shared ids and look labels up by id
+    _, inverse = np.unique(
+        np.concatenate([label_keys, trace_keys]),
+        axis=0,
+        return_inverse=True,
+    )
+    inverse = inverse.reshape(-1)
+    label_of = np.full(inverse.max() + 1, -1, dtype=np.int8)
+    label_of[inverse[: len(label_keys)]] = labels["label"]
+    trace_labels = label_of[inverse[len(label_keys) :]]
+
+    found = trace_labels >= 0
+    return traces["topic_id"][found], traces["score"][found], trace_labels[found] > 0
+
+
+def best_threshold(
+    scores: np.ndarray,
+    labels: np.ndarray,
+    beta: float,
+) -> tuple[float, float, float, float]:
+    """Pick the threshold maximizing F-beta; return it with P, R and F."""
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    true_positives = np.cumsum(labels[order])
+    predicted = np.arange(1, len(scores) + 1)
+
+    # Only cut between distinct scores
+    cuts = np.flatnonzero(np.diff(sorted_scores, append=-np.inf) != 0)
+    precision = true_positives[cuts] / predicted[cuts]
+    recall = true_positives[cuts] / max(labels.sum(), 1)
+
+    beta2 = beta * beta
+    denominator = beta2 * precision + recall
+    f_score = np.divide(
+        (1 + beta2) * precision * recall,
+        denominator,
+        out=np.zeros_like(precision),
+        where=denominator > 0,
+    )
+    best = int(np.argmax(f_score))
+    return (
+        float(sorted_scores[cuts[best]]),
+        float(precision[best]),
+        float(recall[best]),
+        float(f_score[best]),
+    )
+
+
+def calibrate(
+    trace_dir: Path,
+    stage: str,
+    output: Path,
+    default_threshold: float,
+    beta: float,
+    min_samples: int,
+    min_class_samples: int,
+) -> None:
+    traces = load_traces(trace_dir, stage)
+    if not traces:
+        logger.error(f"No {stage} similarity traces found in {trace_dir}")
+        return
+    logger.info(f"Loaded {len(traces['score'])} traced scores from {trace_dir}")
+
+    labels = asyncio.run(load_labels())
+    if not labels:
+        logger.error("No threads found to derive labels from")
+        return
+
+    topic_ids, scores, pair_labels = join_labels(traces, labels)
+    num_positive = int(pair_labels.sum())
+    logger.info(f"Joined {len(scores)} labeled pairs, {num_positive} with replies")
+    if not num_positive:
+        # Without replies every threshold would land on the top traced score
+        logger.error(
+            "No thread has a reply from its initiator, so there are no positive "
+            "labels. Replies are only stored once the telethon service forwards "
+            "thread messages to MESSAGE_PROCESS_THREAD",
+        )
+        raise SystemExit(1)
+
+    thresholds = {}
+    unique_topics, counts = np.unique(topic_ids, return_counts=True)
+    for topic_id, count in zip(unique_topics.tolist(), counts.tolist()):
+        if count < min_samples:
+            logger.info(f"topic {topic_id}: {count} samples, keeping default")
+            continue
+        mask = topic_ids == topic_id
+        positives = int(pair_labels[mask].sum())
+        negatives = count - positives
+        if min(positives, negatives) < min_class_samples:
+            logger.info(
+                f"topic {topic_id}: {positives} positive and {negatives} "
+                "negative samples, keeping default",
+            )
+            continue
+        threshold, precision, recall, f_score = best_threshold(
+            scores[mask],
+            pair_labels[mask],
+            beta,
+        )
+        thresholds[str(topic_id)] = round(threshold, 4)
+        logger.info(
+            f"topic {topic_id}: threshold={threshold:.4f} "
+            f"precision={precision:.3f} recall={recall:.3f} "
+            f"f{beta:g}={f_score:.3f} samples={count}",
+        )
+
+    output.write_text(
+        json.dumps(
+            {"default": default_threshold, "topics": thresholds},
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    logger.info(f"Wrote {len(thresholds)} topic thresholds to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Propose per-topic similarity thresholds",
+    )
+    parser.add_argument(
+        "--traces",
+        type=Path,
+        default=settings.ai_model_dir / settings.SIMILARITY_TRACE_DIR,
+        help="directory with similarity trace files",
+    )
+    parser.add_argument(
+        "--stage",
+        choices=["main", "cascade"],
+        default="main",
+        help="encoder whose traced scores are calibrated",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="thresholds file loaded by the matcher, defaults to the stage's",
+    )
+    parser.add_argument(
+        "--beta",
+        type=float,
+        default=0.5,
+        help="F-beta weight of recall; below 1 favours precision",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=30,
+        help="labeled pairs a topic needs to get its own threshold",
+    )
+    parser.add_argument(
+        "--min-class-samples",
+        type=int,
+        default=5,
+        help="positive and negative pairs a topic needs each",
+    )
+    args = parser.parse_args()
+    if args.stage == "cascade":
+        model_dir = settings.ai_model_dir / settings.CASCADE_MODEL_DIR
+        default_threshold = settings.CASCADE_SIMILARITY_THRESHOLD
+    else:
+        model_dir = settings.ai_model_dir
+        default_threshold = settings.SIMILARITY_THRESHOLD
+    calibrate(
+        args.traces,
+        args.stage,
+        args.output or model_dir / settings.TOPIC_THRESHOLDS_FILE,
+        default_threshold,
+        args.beta,
+        args.min_samples,
+        args.min_class_samples,
+    )
@@ -1,7 +1,14 @@
+import argparse
 import logging
 from pathlib import Path
 
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from onnxruntime.transformers.optimizer import optimize_model
 from optimum.exporters.onnx import main_export
+from tokenizers import Tokenizer
 from transformers import AutoTokenizer
 
 # Configure logging
@@ -15,16 +22,139 @@ logger = logging.getLogger(__name__)
 MODEL_NAME = "ai-forever/sbert_large_nlu_ru"
 EXPORT_PATH = Path("src/ai_model")
 EXPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+# Weights of <model>.onnx are saved to <model>.onnx_data
+EXTERNAL_DATA_SUFFIX = "_data"
 
+# Must match MODEL_VARIANT_FILES in src/core/config.py
+FP32_MODEL_NAME = "model.onnx"
+OPTIMIZED_MODEL_NAME = "model_optimized.onnx"
+INT8_MODEL_NAME = "model_int8.onnx"
 
-def export_model():
-    logger.info(f"Starting model export for {MODEL_NAME}")
+# Small multilingual encoder for the first stage of the matcher cascade,
+# exported to the CASCADE_MODEL_DIR subdirectory
+CASCADE_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+CASCADE_EXPORT_PATH = EXPORT_PATH / "small"
+
+# (num_heads, hidden_size) of each encoder for the graph optimizer
+MODEL_SHAPES = {
+    MODEL_NAME: (16, 1024),
+    CASCADE_MODEL_NAME: (12, 384),
+}
+
+SAMPLE_TEXTS = [
+    "Подскажите, где можно недорого снять квартиру в центре?",
+    "Ищу сдаю однокомнатную квартиру на длительный срок",
+    "Кто знает хорошего стоматолога в нашем районе?",
+    "Посоветуйте клинику для лечения зубов",
+    "Продам велосипед в отличном состоянии, почти не использовался",
+    "Куплю детскую коляску б/у",
+    "Когда следующая встреча клуба?",
+    "Всем привет! Сегодня отличная погода для прогулки",
+    "Нужна помощь с переводом документов на английский",
+    "Ищу репетитора по математике для ребёнка",
+    "Ремонт квартир под ключ, недорого, быстро",
+    "+",
+]
+
+
+def save_with_external_data(model_path: Path) -> None:
+    """Move weights next to the graph so onnxruntime can memory map them."""
+    logger.info(f"Saving weights of {model_path.name} as external data...")
+    location = model_path.name + EXTERNAL_DATA_SUFFIX
+    model = onnx.load(model_path)
+    onnx.save_model(
+        model,
+        model_path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=location,
+    )
+    logger.info(f"Weights saved to {model_path.parent / location}")
+
+
+def optimize_fp32_model(
+    model_name: str,
+    model_path: Path,
+    output_path: Path,
+) -> None:
+    """Fuse attention, LayerNorm and GELU subgraphs with the ORT optimizer."""
+    logger.info("Optimizing ONNX graph...")
+    num_heads, hidden_size = MODEL_SHAPES[model_name]
+    optimized = optimize_model(
+        str(model_path),
+        model_type="bert",
+        num_heads=num_heads,
+        hidden_size=hidden_size,
+    )
+    optimized.save_model_to_file(str(output_path))
+    logger.info(f"Optimized model saved to {output_path}")
+
+
+def quantize_model(model_path: Path, output_path: Path) -> None:
+    """Dynamically quantize MatMul weights to INT8."""
+    logger.info(f"Quantizing {model_path.name} to INT8...")
+    quantize_dynamic(
+        model_input=model_path,
+        model_output=output_path,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    logger.info(f"Quantized model saved to {output_path}")
+
+
+def encode_texts(model_path: Path, texts: list[str]) -> np.ndarray:
+    tokenizer = Tokenizer.from_file(str(model_path.parent / "tokenizer.json"))
+    tokenizer.enable_padding()
+    tokenizer.enable_truncation(max_length=512)
+    tokens = tokenizer.encode_batch(texts)
+    input_ids = np.array([t.ids for t in tokens], dtype=np.int64)
+    attention_mask = np.array([t.attention_mask for t in tokens], dtype=np.int64)
+
+    session = ort.InferenceSession(str(model_path), providers=["CPUExecutionProvider"])
+    input_name, attn_name = (i.name for i in session.get_inputs()[:2])
+    outputs = session.run(
+        [session.get_outputs()[0].name],
+        {input_name: input_ids, attn_name: attention_mask},
+    )[0]
+
+    mask = attention_mask.astype(outputs.dtype)[..., None]
+    embeddings = (outputs * mask).sum(axis=1) / mask.sum(axis=1)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def evaluate_variants(variants: list[Path], texts: list[str]) -> None:
+    """Report cosine similarity drift of each variant against FP32."""
+    logger.info(f"Evaluating similarity drift on {len(texts)} texts...")
+    reference = encode_texts(variants[0].parent / FP32_MODEL_NAME, texts)
+    reference_similarity = reference @ reference.T
+
+    for model_path in variants:
+        embeddings = encode_texts(model_path, texts)
+        drift = np.abs(embeddings @ embeddings.T - reference_similarity)
+        self_similarity = np.sum(embeddings * reference, axis=1)
+        logger.info(
+            f"{model_path.name}: "
+            f"similarity drift max={drift.max():.4f} mean={drift.mean():.4f}, "
+            f"cosine to fp32 min={self_similarity.min():.4f}",
+        )
+
+
+def export_model(
+    model_name: str = MODEL_NAME,
+    export_path: Path = EXPORT_PATH,
+    external_data: bool = False,
+    optimize: bool = False,
+    quantize: bool = False,
+    evaluate: bool = False,
+    samples_path: Path | None = None,
+):
+    logger.info(f"Starting model export for {model_name}")
 
     # 1. Скачиваем и сохраняем ONNX модель через Optimum
     logger.info("Exporting model to ONNX format...")
     main_export(
-        model_name_or_path=MODEL_NAME,
-        output=EXPORT_PATH,
+        model_name_or_path=model_name,
+        output=export_path,
         task="feature-extraction",
         framework="pt",
     )
@@ -32,29 +162,99 @@ def export_model():
 
     # 2. Сохраняем токенизатор
     logger.info("Saving tokenizer...")
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    tokenizer.save_pretrained(EXPORT_PATH)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    tokenizer.save_pretrained(export_path)
     logger.info("Tokenizer saved successfully")
 
     # 3. Удаляем ненужные файлы (если есть)
     logger.info("Cleaning up unnecessary files...")
-    for f in EXPORT_PATH.glob("*onnx_data*"):
+    for f in export_path.glob("*onnx_data*"):
         f.unlink()
         logger.debug(f"Removed file: {f}")
 
+    fp32_path = export_path / FP32_MODEL_NAME
+    variants = []
+    if optimize:
+        optimize_fp32_model(model_name, fp32_path, export_path / OPTIMIZED_MODEL_NAME)
+        variants.append(export_path / OPTIMIZED_MODEL_NAME)
+    if quantize:
+        # Quantizing the fused graph keeps the fused attention kernels
+        source_path = variants[0] if variants else fp32_path
+        quantize_model(source_path, export_path / INT8_MODEL_NAME)
+        variants.append(export_path / INT8_MODEL_NAME)
+
+    if evaluate and variants:
+        texts = SAMPLE_TEXTS
+        if samples_path:
+            texts = [
+                line.strip()
+                for line in samples_path.read_text(encoding="utf-8").splitlines()
+                if line.strip()
+            ]
+        evaluate_variants(variants, texts)
+
+    if external_data:
+        for path in [fp32_path, *variants]:
+            save_with_external_data(path)
+
     for fname in [
         "config.json",
         "tokenizer_config.json",
         "special_tokens_map.json",
         "vocab.txt",
     ]:
-        path = EXPORT_PATH / fname
+        path = export_path / fname
         if path.exists():
             path.unlink()
             logger.debug(f"Removed file: {path}")
 
-    logger.info(f"Model successfully exported to {EXPORT_PATH.resolve()}")
+    logger.info(f"Model successfully exported to {export_path.resolve()}")
 
 
 if __name__ == "__main__":
-    export_model()
+    parser = argparse.ArgumentParser(description=f"Export {MODEL_NAME} to ONNX")
+    parser.add_argument(
+        "--external-data",
+        action="store_true",
+        help="store weights in a separate file that workers memory map",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help=f"also save a graph-optimized model as {OPTIMIZED_MODEL_NAME}",
+    )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        help=f"also save a dynamically quantized INT8 model as {INT8_MODEL_NAME}",
+    )
+    parser.add_argument(
+        "--evaluate",
+        action="store_true",
+        help="report similarity drift of the produced variants against FP32",
+    )
+    parser.add_argument(
+        "--samples",
+        type=Path,
+        help="text file with one evaluation sample per line",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help=f"also export {CASCADE_MODEL_NAME} to {CASCADE_EXPORT_PATH}",
+    )
+    args = parser.parse_args()
+
+    models = [(MODEL_NAME, EXPORT_PATH)]
+    if args.cascade:
+        models.append((CASCADE_MODEL_NAME, CASCADE_EXPORT_PATH))
+    for model_name, export_path in models:
+        export_model(
+            model_name=model_name,
+            export_path=export_path,
+            external_data=args.external_data,
+            optimize=args.optimize,
+            quantize=args.quantize,
+            evaluate=args.evaluate,
+            samples_path=args.samples,
+        )
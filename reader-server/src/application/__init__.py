@@ -3,11 +3,12 @@ Application module containing business logic and use cases.
 """
 
 from src.application.batch import BatchCollector, BatchManager, BatchProcessor
-from src.application.services import MessageProcessor
+from src.application.services import MessageFilter, MessageProcessor
 
 __all__ = [
     "BatchCollector",
     "BatchManager",
     "BatchProcessor",
+    "MessageFilter",
     "MessageProcessor",
 ]
@@ -7,67 +7,181 @@ from src.domain import Message
 
 
 class BatchCollector:
+    """Collects messages into batches for ``process_func``.
+
+    A batch is flushed on whichever comes first:
+    - it holds ``batch_size`` messages or ``max_tokens`` tokens;
+    - its oldest message has waited ``batch_time`` seconds;
+    - its oldest message has waited ``idle_time`` seconds while no batch is
+      being processed, so messages are not held back by an idle encoder
+      however steadily they arrive.
+
+    ``batch_size`` doubles up to ``max_batch_size`` each time a batch fills
+    up, which happens when messages back up, and shrinks back towards its
+    initial value when batches are flushed less than half full.
+
+    Flushed batches are processed in background tasks, so the next batch
+    keeps accumulating while up to ``max_in_flight`` batches are processed.
+    Once every slot is busy, flushing waits for one to free up and ``add``
+    blocks, which pushes back on the consumer.
+
+    ``add`` returns a future that resolves once the message's batch has been
+    processed, or fails with the batch's error, so callers can acknowledge
+    messages only after processing.
+    """
+
     def __init__(
         self,
         batch_size: int,
-        batch_time: int,
+        batch_time: float,
         process_func: Callable[[list[Message]], Any],
         logger: structlog.typing.FilteringBoundLogger,
+        max_batch_size: int | None = None,
+        max_tokens: int | None = None,
+        idle_time: float | None = None,
+        token_counter: Callable[[str], int] | None = None,
+        max_in_flight: int = 1,
     ):
+        self.min_batch_size = batch_size
         self.batch_size = batch_size
+        self.max_batch_size = max(max_batch_size or batch_size, batch_size)
         self.batch_time = batch_time
+        self.max_tokens = max_tokens
+        self.idle_time = idle_time
+        self.token_counter = token_counter or (lambda text: len(text.split()))
         self.process_func = process_func
         self.buffer: list[Message] = []
+        self.pending: list[asyncio.Future[None]] = []
+        self.buffer_tokens = 0
+        self.deadline = 0.0
+        self.started_at = 0.0
+        self.max_in_flight = max_in_flight
+        self.in_flight: set[asyncio.Task] = set()
+        self._slots = asyncio.Semaphore(max_in_flight)
         self.lock = asyncio.Lock()
         self.timer_task: asyncio.Task | None = None
         self.logger = logger
 
-    async def add(self, msg: Message) -> None:
+    async def add(self, msg: Message) -> asyncio.Future[None]:
+        tokens = self.token_counter(msg.text)
         async with self.lock:
+            if (
+                self.buffer
+                and self.max_tokens
+                and self.buffer_tokens + tokens > self.max_tokens
+            ):
+                await self._flush("tokens")
+
+            now = asyncio.get_running_loop().time()
             if not self.buffer:
                 self.logger.debug(
                     "starting_batch_timer",
                     batch_time=self.batch_time,
+                    idle_time=self.idle_time,
                 )
+                self.started_at = now
+                self.deadline = now + self.batch_time
                 self.timer_task = asyncio.create_task(self._flush_by_time())
+            processed = asyncio.get_running_loop().create_future()
             self.buffer.append(msg)
+            self.pending.append(processed)
+            self.buffer_tokens += tokens
             self.logger.debug(
                 "message_added_to_batch",
                 buffer_size=len(self.buffer),
+                buffer_tokens=self.buffer_tokens,
                 batch_size=self.batch_size,
             )
             if len(self.buffer) >= self.batch_size:
-                await self._flush()
+                await self._flush("size")
+        return processed
 
-    async def _flush(self) -> None:
+    async def _flush(self, reason: str) -> None:
         if self.buffer:
             to_process = self.buffer.copy()
+            pending = self.pending.copy()
+            tokens = self.buffer_tokens
             self.buffer.clear()
-            if self.timer_task:
+            self.pending.clear()
+            self.buffer_tokens = 0
+            if self.timer_task and self.timer_task is not asyncio.current_task():
                 self.timer_task.cancel()
-                self.timer_task = None
+            self.timer_task = None
+            self._adapt_batch_size(len(to_process), reason)
             self.logger.info(
                 "flushing_batch",
                 batch_size=len(to_process),
+                batch_tokens=tokens,
+                reason=reason,
+                next_batch_size=self.batch_size,
             )
-            try:
-                await self.process_func(to_process)
-                self.logger.info(
-                    "batch_processed_successfully",
-                    batch_size=len(to_process),
-                )
-            except Exception as e:
-                self.logger.exception(
-                    "batch_processing_error",
-                    batch_size=len(to_process),
-                    error=str(e),
-                )
-                raise
+            # Wait for a free slot, then process without holding the lock
+            await self._slots.acquire()
+            task = asyncio.create_task(self._process(to_process, pending))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+
+    async def _process(
+        self,
+        to_process: list[Message],
+        pending: list[asyncio.Future[None]],
+    ) -> None:
+        try:
+            await self.process_func(to_process)
+            self.logger.info(
+                "batch_processed_successfully",
+                batch_size=len(to_process),
+            )
+        except Exception as e:
+            self.logger.exception(
+                "batch_processing_error",
+                batch_size=len(to_process),
+                error=str(e),
+            )
+            for processed in pending:
+                processed.set_exception(e)
+        else:
+            for processed in pending:
+                processed.set_result(None)
+        finally:
+            self._slots.release()
+
+    async def close(self) -> None:
+        """Flush the buffered batch and wait for every in-flight batch."""
+        async with self.lock:
+            await self._flush("close")
+        if self.timer_task:
+            self.timer_task.cancel()
+        await asyncio.gather(*self.in_flight, return_exceptions=True)
+        self.logger.info("batch_collector_closed")
+
+    def _adapt_batch_size(self, size: int, reason: str) -> None:
+        if reason in ("size", "tokens"):
+            self.batch_size = min(self.batch_size * 2, self.max_batch_size)
+        elif size < self.batch_size // 2:
+            self.batch_size = max(self.batch_size // 2, self.min_batch_size)
 
     async def _flush_by_time(self) -> None:
         try:
-            await asyncio.sleep(self.batch_time)
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if now >= self.deadline:
+                    reason = "deadline"
+                    break
+                wake_at = self.deadline
+                if self.idle_time is not None:
+                    idle_at = self.started_at + self.idle_time
+                    if now >= idle_at:
+                        if not self.in_flight:
+                            reason = "idle"
+                            break
+                        # The encoder is busy, check again later
+                        idle_at = now + self.idle_time
+                    wake_at = min(wake_at, idle_at)
+                await asyncio.sleep(wake_at - now)
+
             async with self.lock:
-                await self._flush()
+                await self._flush(reason)
         except asyncio.CancelledError:
             self.logger.debug("batch_timer_cancelled")
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, Callable
 
 import structlog
@@ -12,7 +13,7 @@ class BatchManager:
     def __init__(
         self,
         batch_size: int,
-        batch_time: int,
+        batch_time: float,
         process_func: Callable[[list[Message]], Any],
         logger: structlog.typing.FilteringBoundLogger,
     ):
@@ -25,12 +26,12 @@ class BatchManager:
         self.processor = BatchProcessor(process_func, logger)
         self.logger = logger
 
-    async def add(self, msg: Message) -> None:
+    async def add(self, msg: Message) -> asyncio.Future[None]:
         self.logger.debug(
             "adding_message_to_batch",
             message_id=msg.id,
         )
-        await self.collector.add(msg)
+        return await self.collector.add(msg)
 
     async def _process_batch(self, messages: list[Message]) -> None:
         self.logger.info(
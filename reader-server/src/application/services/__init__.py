@@ -2,6 +2,7 @@
 Application services module containing business logic implementations.
 """
 
+from src.application.services.message_filter import MessageFilter
 from src.application.services.message_processor import MessageProcessor
 
-__all__ = ["MessageProcessor"]
+__all__ = ["MessageFilter", "MessageProcessor"]
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+from collections import Counter
+
+import structlog
+
+from src.domain import Message
+
+_URL = re.compile(r"(?:https?://|www\.|t\.me/)\S+", re.IGNORECASE)
+_MENTION = re.compile(r"[@#]\w+")
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+
+class MessageFilter:
+    """Cheap checks that drop messages which cannot match any topic.
+
+    Runs before messages are batched, so stickers' captions, one-word
+    replies, emoji-only and link-only messages never reach the encoder.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int,
+        scripts: list[str],
+        min_script_ratio: float,
+        logger: structlog.typing.FilteringBoundLogger,
+    ) -> None:
+        self.min_tokens = min_tokens
+        self.scripts = tuple(script.upper() for script in scripts)
+        self.min_script_ratio = min_script_ratio
+        self.logger = logger
+
+        self.passed = 0
+        self.dropped: Counter[str] = Counter()
+
+    def accept(self, msg: Message) -> bool:
+        reason = self.check(msg.text)
+        if reason is None:
+            self.passed += 1
+            return True
+
+        self.dropped[reason] += 1
+        self.logger.debug(
+            "message_filtered",
+            message_id=msg.telegram_message_id,
+            user_id=msg.user_id,
+            chat_id=msg.chat_id,
+            reason=reason,
+            **self.stats(),
+        )
+        return False
+
+    def check(self, text: str) -> str | None:
+        """Return the reason to drop the text, or None to keep it."""
+        stripped = _MENTION.sub(" ", _URL.sub(" ", text))
+        words = _WORD.findall(stripped)
+        if not words:
+            if _URL.search(text):
+                return "url_only"
+            if any(unicodedata.category(ch) == "So" for ch in text):
+                return "emoji_only"
+            return "no_words"
+
+        if len(words) < self.min_tokens:
+            return "too_short"
+
+        if self.scripts:
+            letters = [ch for word in words for ch in word]
+            in_scripts = sum(
+                unicodedata.name(ch, "").startswith(self.scripts) for ch in letters
+            )
+            if in_scripts < self.min_script_ratio * len(letters):
+                return "charset"
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "passed": self.passed,
+            "dropped": sum(self.dropped.values()),
+            **{f"dropped_{reason}": count for reason, count in self.dropped.items()},
+        }
@@ -1,21 +1,17 @@
-import json
 from collections import defaultdict
-from datetime import datetime
-from pathlib import Path
-from typing import TypedDict
 
 import numpy as np
 import structlog
 
 from src.core import settings
-from src.domain import AnswerTask, Message, Topic
-from src.infrastructure import AnswerTaskPublisher, SentenceTransformerService
-
-
-class TopicEmbedding(TypedDict):
-    text: str
-    embedding: np.ndarray
-    topic: Topic
+from src.domain import AnswerTask, Message
+from src.infrastructure import (
+    AnswerTaskPublisher,
+    BatchTopicMatrix,
+    ChatTopicIndex,
+    SentenceTransformerService,
+    SimilarityTraceSink,
+)
 
 
 class MessageProcessor:
@@ -24,10 +20,20 @@ class MessageProcessor:
         embedding_service: SentenceTransformerService,
         publisher: AnswerTaskPublisher,
         logger: structlog.typing.FilteringBoundLogger,
+        cascade_service: SentenceTransformerService | None = None,
+        trace_sink: SimilarityTraceSink | None = None,
     ) -> None:
         self.embedding_service = embedding_service
+        self.cascade_service = cascade_service
+        self.trace_sink = trace_sink
         self.publisher = publisher
         self.logger = logger
+        self.cascade_stats = {
+            "messages": 0,
+            "accepted": 0,
+            "rejected": 0,
+            "escalated": 0,
+        }
 
     async def process_messages(self, batch: list[Message]) -> None:
         """Process a batch of messages, matching them to relevant topics."""
@@ -37,187 +43,246 @@ class MessageProcessor:
         grouped_messages = self._group_messages_by_user_chat(batch)
         self.logger.info("messages_grouped", num_groups=len(grouped_messages))
 
-        for (user_id, chat_id), messages in grouped_messages.items():
-            await self._process_user_chat_messages(user_id, chat_id, messages)
+        if self.cascade_service is not None:
+            grouped_messages = await self._run_cascade(grouped_messages)
+
+        scored = await self._score_groups(
+            self.embedding_service,
+            grouped_messages,
+            stage="main",
+        )
+        if scored is not None:
+            # Process matches and publish tasks
+            messages, scores, topic_matrix = scored
+            await self._publish_matching_tasks(
+                messages,
+                *self._select_matches(scores, topic_matrix.thresholds),
+                topic_matrix,
+            )
 
         self.logger.info("completed_message_processing", total_messages=len(batch))
 
-    @staticmethod
-    def _group_messages_by_user_chat(
-        batch: list[Message],
+    async def _run_cascade(
+        self,
+        grouped_messages: dict[tuple[int, int], list[Message]],
     ) -> dict[tuple[int, int], list[Message]]:
-        """Group messages by user_id and chat_id."""
-        grouped: dict[tuple[int, int], list[Message]] = defaultdict(list)
-        for msg in batch:
-            grouped[msg.user_id, msg.chat_id].append(msg)
-        return grouped
+        """Score messages with the small model and keep only uncertain ones.
+
+        Thresholds are the small model's own, calibrated from its traces.
+        Matches well above the topic threshold are published right away,
+        scores well below it are dropped, and messages within CASCADE_BAND
+        of the threshold are returned for re-scoring with the large model.
+        """
+        scored = await self._score_groups(
+            self.cascade_service,
+            grouped_messages,
+            stage="cascade",
+        )
+        if scored is None:
+            return {}
+
+        messages, scores, topic_matrix = scored
+        thresholds = topic_matrix.thresholds
+        rows, columns, match_scores = self._select_matches(scores, thresholds)
+        # A message is accepted only when every selected topic clears the band
+        confident = match_scores >= thresholds[columns] + settings.CASCADE_BAND
+        accepted = np.zeros(len(messages), dtype=bool)
+        accepted[rows] = True
+        accepted[rows[~confident]] = False
+        # Everything else close to some topic's threshold goes to the large
+        # model, including confident messages dropped by the margin
+        near = (scores >= thresholds - settings.CASCADE_BAND).any(axis=1)
+        escalated = ~accepted & near
+
+        keep = accepted[rows]
+        await self._publish_matching_tasks(
+            messages,
+            rows[keep],
+            columns[keep],
+            match_scores[keep],
+            topic_matrix,
+        )
 
-    async def _process_user_chat_messages(
-        self,
-        user_id: int,
-        chat_id: int,
-        messages: list[Message],
-    ) -> None:
-        """Process messages for a specific user and chat."""
+        num_accepted = int(accepted.sum())
+        num_escalated = int(escalated.sum())
+        self.cascade_stats["messages"] += len(messages)
+        self.cascade_stats["accepted"] += num_accepted
+        self.cascade_stats["escalated"] += num_escalated
+        self.cascade_stats["rejected"] += len(messages) - num_accepted - num_escalated
         self.logger.info(
-            "processing_user_chat_messages",
-            user_id=user_id,
-            chat_id=chat_id,
-            message_count=len(messages),
+            "cascade_stage_completed",
+            batch_escalated=num_escalated,
+            batch_messages=len(messages),
+            escalation_rate=round(
+                self.cascade_stats["escalated"] / self.cascade_stats["messages"],
+                4,
+            ),
+            **self.cascade_stats,
         )
 
-        # Get topic embeddings
-        topic_embeddings = await self.embedding_service.get_topic_embeddings(
-            user_id,
-            chat_id,
+        return self._group_messages_by_user_chat(
+            [messages[i] for i in np.flatnonzero(escalated)],
         )
-        self.logger.info("retrieved_topic_embeddings", num_topics=len(topic_embeddings))
 
-        if not topic_embeddings:
-            return
-
-        # Prepare topic data
-        topic_data = self._prepare_topic_data(topic_embeddings)
-
-        # Process messages
-        message_texts = [msg.text for msg in messages]
-        message_embeddings = await self.embedding_service.encode_messages(message_texts)
+    async def _score_groups(
+        self,
+        embedding_service: SentenceTransformerService,
+        grouped_messages: dict[tuple[int, int], list[Message]],
+        stage: str,
+    ) -> tuple[list[Message], np.ndarray, BatchTopicMatrix] | None:
+        """Score every message against its chat's topics.
+
+        Returns the scored messages, their scores against every topic of
+        the batch topic matrix, with topics of other chats set to -inf, and
+        the matrix itself, or None when no chat of the batch has topics.
+        Traced scores are tagged with ``stage``.
+        """
+        # Resolve topics first so that messages of chats without topics
+        # never reach the encoder
+        groups: list[tuple[int, int, list[Message], ChatTopicIndex]] = []
+        for (user_id, chat_id), chat_messages in grouped_messages.items():
+            topic_index = await embedding_service.get_topic_embeddings(
+                user_id,
+                chat_id,
+            )
+            self.logger.info(
+                "retrieved_topic_embeddings",
+                user_id=user_id,
+                chat_id=chat_id,
+                num_topics=len(topic_index),
+            )
+            if not topic_index:
+                continue
+            groups.append((user_id, chat_id, chat_messages, topic_index))
+
+        if not groups:
+            self.logger.info("no_groups_with_topics")
+            return None
+
+        # Encode every message of the batch in a single pass
+        messages = [msg for _, _, chat_messages, _ in groups for msg in chat_messages]
+        message_embeddings = await embedding_service.encode_messages(
+            [msg.text for msg in messages],
+        )
         self.logger.info("encoded_messages", num_messages=len(message_embeddings))
 
-        # Compute similarities and find matches
-        similarity_scores = await self.embedding_service.compute_similarity(
-            message_embeddings,
-            topic_data["embeddings"],
+        # Score the whole batch against the union of its chats' topics
+        topic_matrix = BatchTopicMatrix.build(
+            [topic_index for _, _, _, topic_index in groups],
+            [len(chat_messages) for _, _, chat_messages, _ in groups],
         )
-        self._save_debug_similarity(
-            user_id,
-            chat_id,
-            messages,
-            similarity_scores,
-            topic_data,
+        similarity_scores = await embedding_service.compute_similarity(
+            message_embeddings,
+            topic_matrix.matrix,
         )
-        # Get best matches using vectorized operations
-        max_indices = np.argmax(similarity_scores, axis=1)
-        max_scores = similarity_scores[np.arange(len(similarity_scores)), max_indices]
-
-        # Process matches and publish tasks
-        await self._publish_matching_tasks(
-            user_id,
-            chat_id,
-            messages,
-            max_scores,
-            max_indices,
-            topic_data,
+        self.logger.info(
+            "computed_batch_similarity",
+            num_messages=len(messages),
+            num_topics=len(topic_matrix.topics),
         )
 
-    def _save_debug_similarity(
-        self,
-        user_id: int,
-        chat_id: int,
-        messages: list[Message],
-        similarity_scores: np.ndarray,
-        topic_data: dict[str, list],
-    ) -> None:
-        """Сохраняет similarity-оценки по пользователю и дате, дописывая в файл."""
-
-        debug_dir = Path(settings.src_dir) / "ai_model" / "similarity_debug"
-        debug_dir.mkdir(parents=True, exist_ok=True)
+        if self.trace_sink is not None:
+            offset = 0
+            for (user_id, chat_id, chat_messages, topic_index), columns in zip(
+                groups,
+                topic_matrix.columns,
+            ):
+                rows = slice(offset, offset + len(chat_messages))
+                self.trace_sink.record(
+                    user_id,
+                    chat_id,
+                    chat_messages,
+                    similarity_scores[rows][:, columns],
+                    topic_index.topic_ids,
+                    stage=stage,
+                )
+                offset += len(chat_messages)
 
-        date_str = datetime.now().strftime("%Y%m%d")
-        filename = debug_dir / f"{user_id}_{date_str}.json"
+        # Only topics bound to each message's chat can match
+        masked_scores = np.where(topic_matrix.mask, similarity_scores, -np.inf)
+        return messages, masked_scores, topic_matrix
 
-        if filename.exists():
-            with filename.open(encoding="utf-8") as f:
-                existing_data = json.load(f)
+    @staticmethod
+    def _select_matches(
+        scores: np.ndarray,
+        thresholds: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pick up to MATCH_TOP_K topics per message.
+
+        A topic matches when its score reaches its own threshold and beats
+        the best topic outside the top k by at least MATCH_MARGIN, so with
+        the default k of 1 ambiguous messages close to a second topic are
+        dropped. Returns message rows, topic columns and scores of matches.
+        """
+        k = min(settings.MATCH_TOP_K, scores.shape[1])
+        order = np.argsort(-scores, axis=1, kind="stable")
+        top = order[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        if scores.shape[1] > k:
+            runner_up = np.take_along_axis(scores, order[:, k : k + 1], axis=1)
         else:
-            existing_data = []
-
-        new_entries = []
-        for i, message in enumerate(messages):
-            entry = {
-                "created_at": message.created_at,
-                "chat_id": chat_id,
-                "message_id": message.telegram_message_id,
-                "message_text": message.text,
-                "similarities": [],
-            }
-            for j, topic in enumerate(topic_data["topics"]):
-                entry["similarities"].append({
-                    "topic_id": topic.id,
-                    "topic_name": topic.name,
-                    "topic_description": topic.description,
-                    "score": float(similarity_scores[i][j]),
-                })
-            new_entries.append(entry)
-
-        existing_data.extend(new_entries)
-
-        with filename.open("w", encoding="utf-8") as f:
-            json.dump(existing_data, f, ensure_ascii=False, indent=2)
+            runner_up = np.full((len(scores), 1), -np.inf, dtype=scores.dtype)
 
-        self.logger.info(
-            "similarity_debug_appended",
-            file_path=str(filename),
-            new_messages=len(messages),
-            total_messages=len(existing_data),
-        )
+        # -inf minus -inf only happens for topics that fail their threshold
+        with np.errstate(invalid="ignore"):
+            matched = (top_scores >= thresholds[top]) & (
+                top_scores - runner_up >= settings.MATCH_MARGIN
+            )
+        rows, ranks = np.nonzero(matched)
+        return rows, top[rows, ranks], top_scores[rows, ranks]
 
     @staticmethod
-    def _prepare_topic_data(
-        topic_embeddings: dict[int, tuple[str, np.ndarray, Topic]],
-    ) -> dict[str, list]:
-        """Prepare topic data for processing."""
-        topic_ids = list(topic_embeddings.keys())
-        return {
-            "ids": topic_ids,
-            "embeddings": [topic_embeddings[tid][1] for tid in topic_ids],
-            "topics": [topic_embeddings[tid][2] for tid in topic_ids],
-        }
+    def _group_messages_by_user_chat(
+        batch: list[Message],
+    ) -> dict[tuple[int, int], list[Message]]:
+        """Group messages by user_id and chat_id."""
+        grouped: dict[tuple[int, int], list[Message]] = defaultdict(list)
+        for msg in batch:
+            grouped[msg.user_id, msg.chat_id].append(msg)
+        return grouped
 
     async def _publish_matching_tasks(
         self,
-        user_id: int,
-        chat_id: int,
         messages: list[Message],
+        rows: np.ndarray,
+        columns: np.ndarray,
         scores: np.ndarray,
-        indices: np.ndarray,
-        topic_data: dict[str, list],
+        topic_matrix: BatchTopicMatrix,
     ) -> None:
-        """Publish tasks for messages that match topics above threshold."""
-        tasks_published = 0
-        for i, (score, idx) in enumerate(zip(scores, indices)):
-            if score >= settings.SIMILARITY_THRESHOLD:
-                msg = messages[i]
-                matched_topic = topic_data["topics"][idx]
-
-                task = AnswerTask(
-                    telegram_message_id=msg.telegram_message_id,
-                    user_id=user_id,
-                    chat_id=chat_id,
-                    text=msg.text,
-                    sender_username=msg.sender_username,
-                    sender_id=msg.sender_id,
-                    created_at=msg.created_at,
-                    topic_id=matched_topic.id,
-                    score=float(score),  # Convert numpy float to Python float
-                )
-                print(task)
-
-                await self.publisher.send(task)
-                tasks_published += 1
-
-                self.logger.info(
-                    "published_answer_task",
-                    user_id=user_id,
-                    chat_id=chat_id,
-                    message_id=msg.telegram_message_id,
-                    topic_id=matched_topic.id,
-                    confidence_score=float(score),
-                )
+        """Publish a task for every selected (message, topic) match."""
+        tasks = []
+        for row, column, score in zip(rows.tolist(), columns.tolist(), scores.tolist()):
+            msg = messages[row]
+            matched_topic = topic_matrix.topics[column]
+
+            task = AnswerTask(
+                telegram_message_id=msg.telegram_message_id,
+                user_id=msg.user_id,
+                chat_id=msg.chat_id,
+                text=msg.text,
+                sender_username=msg.sender_username,
+                sender_id=msg.sender_id,
+                created_at=msg.created_at,
+                topic_id=matched_topic.id,
+                score=score,
+            )
+            print(task)
+            tasks.append(task)
+
+        await self.publisher.send_many(tasks)
+
+        for task in tasks:
+            self.logger.info(
+                "published_answer_task",
+                user_id=task.user_id,
+                chat_id=task.chat_id,
+                message_id=task.telegram_message_id,
+                topic_id=task.topic_id,
+                confidence_score=task.score,
+            )
 
         self.logger.info(
-            "finished_processing_user_chat",
-            user_id=user_id,
-            chat_id=chat_id,
-            tasks_published=tasks_published,
+            "finished_publishing_batch",
+            num_messages=len(messages),
+            tasks_published=len(tasks),
         )
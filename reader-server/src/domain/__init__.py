@@ -2,10 +2,18 @@
 Domain module containing core business models and interfaces.
 """
 
-from .models import AnswerTask, Message, Topic
+from .models import (
+    AnswerTask,
+    CacheEventType,
+    CacheInvalidationEvent,
+    Message,
+    Topic,
+)
 
 __all__ = [
     "AnswerTask",
+    "CacheEventType",
+    "CacheInvalidationEvent",
     "Message",
     "Topic",
 ]
@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 
 from pydantic import BaseModel
 
@@ -30,3 +31,16 @@ class AnswerTask(BaseModel):
     sender_username: str
     sender_id: int
     created_at: datetime
+
+
+class CacheEventType(str, Enum):
+    TOPIC_UPDATED = "topic_updated"
+    TOPIC_DELETED = "topic_deleted"
+    CHAT_TOPICS_CHANGED = "chat_topics_changed"
+
+
+class CacheInvalidationEvent(BaseModel):
+    event: CacheEventType
+    user_id: int
+    topic_id: int | None = None
+    telegram_chat_id: int | None = None
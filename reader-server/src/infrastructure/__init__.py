@@ -14,17 +14,25 @@ from .database import (
     get_message_repository,
     get_topic_repository,
 )
-from .embeddings import SentenceTransformerService
+from .embeddings import (
+    BatchTopicMatrix,
+    ChatTopicIndex,
+    SentenceTransformerService,
+)
 from .messaging import AnswerTaskPublisher
+from .tracing import SimilarityTraceSink
 
 __all__ = [
     "AnswerTaskPublisher",
     "Base",
+    "BatchTopicMatrix",
     "Chat",
     "ChatTopic",
+    "ChatTopicIndex",
     "SQLAlchemyMessageRepository",
     "SQLAlchemyTopicRepository",
     "SentenceTransformerService",
+    "SimilarityTraceSink",
     "Topic",
     "User",
     "db_manager",
@@ -2,6 +2,19 @@
 Embeddings module containing semantic similarity implementations.
 """
 
+from .cache import TopicEmbeddingCache
+from .executor import InferenceExecutor
+from .index import BatchTopicMatrix, ChatTopicIndex
+from .message_cache import MessageEmbeddingCache
 from .service import SentenceTransformerService
+from .store import TopicEmbeddingStore
 
-__all__ = ["SentenceTransformerService"]
+__all__ = [
+    "BatchTopicMatrix",
+    "ChatTopicIndex",
+    "InferenceExecutor",
+    "MessageEmbeddingCache",
+    "SentenceTransformerService",
+    "TopicEmbeddingCache",
+    "TopicEmbeddingStore",
+]
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from datetime import datetime, timedelta
+from typing import Any
+
+import structlog
+
+
+class TopicEmbeddingCache:
+    """LRU cache of per-chat topic embeddings bounded by a byte budget.
+
+    Entries expire after ``ttl`` and the least recently used ones are
+    evicted once the accounted size of all entries exceeds ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: timedelta,
+        logger: structlog.typing.FilteringBoundLogger,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.logger = logger
+
+        # {key: (data, size in bytes, timestamp)}
+        self._entries: OrderedDict[Hashable, tuple[Any, int, datetime]] = (
+            OrderedDict()
+        )
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        data, _, timestamp = entry
+        if datetime.now() - timestamp > self.ttl:
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return data
+
+    def put(self, key: Hashable, data: Any, size: int) -> None:
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            self.logger.warning(
+                "topic_cache_entry_too_large",
+                size=size,
+                max_bytes=self.max_bytes,
+            )
+            return
+
+        self._entries[key] = (data, size, datetime.now())
+        self.current_bytes += size
+
+        evicted = 0
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            self.logger.info("topic_cache_evicted", evicted=evicted, **self.stats())
+
+    def invalidate(self, key: Hashable) -> bool:
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        return True
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Remove every entry whose data matches the predicate."""
+        keys = [key for key, (data, _, _) in self._entries.items() if predicate(data)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
@@ -0,0 +1,179 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import onnxruntime as ort
+import structlog
+
+# Session of the current encoder worker process
+_worker_session: ort.InferenceSession | None = None
+
+
+def external_data_path(model_path: Path) -> Path:
+    """Weights file written by ``export_onnx_model.py --external-data``."""
+    return model_path.with_name(model_path.name + "_data")
+
+
+def create_session(
+    model_path: Path,
+    num_threads: int,
+    mmap_weights: bool = False,
+) -> ort.InferenceSession:
+    sess_options = ort.SessionOptions()
+    sess_options.intra_op_num_threads = num_threads
+    sess_options.inter_op_num_threads = 1
+    if mmap_weights and external_data_path(model_path).exists():
+        # Weights stored as external data are memory mapped by onnxruntime.
+        # Prepacking would copy them into private buffers of every process.
+        # Inline weights are read into each process anyway, so prepacking
+        # stays on for them.
+        sess_options.add_session_config_entry("session.disable_prepacking", "1")
+    return ort.InferenceSession(
+        str(model_path),
+        sess_options=sess_options,
+        providers=["CPUExecutionProvider"],
+    )
+
+
+def run_session(
+    session: ort.InferenceSession,
+    input_ids: np.ndarray,
+    attention_mask: np.ndarray,
+) -> np.ndarray:
+    """Run the encoder and mean-pool token embeddings over the attention mask."""
+    input_name, attn_name = (i.name for i in session.get_inputs()[:2])
+    outputs = session.run(
+        [session.get_outputs()[0].name],
+        {
+            input_name: input_ids,
+            attn_name: attention_mask,
+        },
+    )[0]  # (batch_size, seq_len, hidden_size)
+
+    # mean pooling
+    mask = attention_mask.astype(outputs.dtype)
+    return (outputs * np.expand_dims(mask, axis=-1)).sum(
+        axis=1,
+    ) / mask.sum(axis=1, keepdims=True)
+
+
+def _init_worker(
+    model_path: Path,
+    num_threads: int,
+    mmap_weights: bool,
+    pin_cpus: bool,
+    worker_counter: "multiprocessing.sharedctypes.Synchronized[int]",
+) -> None:
+    global _worker_session
+
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    if pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        start = worker_index * num_threads
+        worker_cpus = cpus[start : start + num_threads]
+        if worker_cpus:
+            os.sched_setaffinity(0, worker_cpus)
+
+    _worker_session = create_session(model_path, num_threads, mmap_weights)
+
+
+def _run_in_worker(input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    return run_session(_worker_session, input_ids, attention_mask)
+
+
+class InferenceExecutor:
+    """Runs ONNX inference off the event loop.
+
+    In ``thread`` mode a thread pool shares one session: onnxruntime
+    releases the GIL during ``session.run`` and a session is thread-safe.
+    In ``process`` mode every worker process owns a session with its own
+    intra-op thread count, optionally pinned to a disjoint set of CPUs, and
+    batches are distributed over the pool's local call queue.
+
+    ``max_pending`` bounds the number of submitted batches; further callers
+    wait for a free slot instead of piling work onto the pool.
+    """
+
+    def __init__(
+        self,
+        model_path: Path,
+        workers: int,
+        threads_per_worker: int,
+        max_pending: int,
+        logger: structlog.typing.FilteringBoundLogger,
+        mode: Literal["thread", "process"] = "thread",
+        mmap_weights: bool = False,
+        pin_cpus: bool = False,
+    ) -> None:
+        self.mode = mode
+        self.session: ort.InferenceSession | None = None
+        self._pool: Executor
+        if mode == "process":
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    model_path,
+                    threads_per_worker,
+                    mmap_weights,
+                    pin_cpus,
+                    context.Value("i", 0),
+                ),
+            )
+        else:
+            self.session = create_session(
+                model_path,
+                threads_per_worker,
+                mmap_weights,
+            )
+            self._pool = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="onnx-inference",
+            )
+        self._slots = asyncio.Semaphore(max_pending)
+        self.logger = logger
+        self.logger.info(
+            "initialized_inference_executor",
+            mode=mode,
+            workers=workers,
+            threads_per_worker=threads_per_worker,
+            max_pending=max_pending,
+            mmap_weights=mmap_weights,
+            external_data=external_data_path(model_path).exists(),
+            pin_cpus=pin_cpus,
+        )
+
+    async def run(
+        self,
+        input_ids: np.ndarray,
+        attention_mask: np.ndarray,
+    ) -> np.ndarray:
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            if self.session is None:
+                return await loop.run_in_executor(
+                    self._pool,
+                    _run_in_worker,
+                    input_ids,
+                    attention_mask,
+                )
+            return await loop.run_in_executor(
+                self._pool,
+                run_session,
+                self.session,
+                input_ids,
+                attention_mask,
+            )
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+        self.logger.info("inference_executor_stopped")
@@ -0,0 +1,127 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.domain import Topic
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Return L2-normalized float32 rows as a C-contiguous matrix."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.ascontiguousarray(embeddings / np.maximum(norms, 1e-12))
+
+
+@dataclass(frozen=True, slots=True)
+class ChatTopicIndex:
+    """Topics of one chat packed for similarity scoring.
+
+    ``matrix`` holds one pre-normalized float32 row per topic, so cosine
+    similarity against normalized message embeddings is a single GEMM.
+    ``topic_ids``, ``thresholds`` and ``topics`` are parallel to its rows.
+    """
+
+    topic_ids: np.ndarray
+    thresholds: np.ndarray
+    matrix: np.ndarray
+    topics: list[Topic]
+
+    @classmethod
+    def build(
+        cls,
+        topics: list[Topic],
+        embeddings: dict[int, np.ndarray],
+        threshold: float,
+        topic_thresholds: dict[int, float] | None = None,
+    ) -> "ChatTopicIndex":
+        """Pack topics; ``topic_thresholds`` overrides ``threshold`` per topic."""
+        if not topics:
+            return cls.empty()
+        topic_thresholds = topic_thresholds or {}
+        return cls(
+            topic_ids=np.array([t.id for t in topics], dtype=np.int64),
+            thresholds=np.array(
+                [topic_thresholds.get(t.id, threshold) for t in topics],
+                dtype=np.float32,
+            ),
+            matrix=normalize(np.stack([embeddings[t.id] for t in topics])),
+            topics=list(topics),
+        )
+
+    @classmethod
+    def empty(cls) -> "ChatTopicIndex":
+        return cls(
+            topic_ids=np.empty(0, dtype=np.int64),
+            thresholds=np.empty(0, dtype=np.float32),
+            matrix=np.empty((0, 0), dtype=np.float32),
+            topics=[],
+        )
+
+    def __len__(self) -> int:
+        return len(self.topics)
+
+    def __contains__(self, topic_id: int) -> bool:
+        return bool(np.any(self.topic_ids == topic_id))
+
+    @property
+    def nbytes(self) -> int:
+        return self.topic_ids.nbytes + self.thresholds.nbytes + self.matrix.nbytes
+
+
+@dataclass(frozen=True, slots=True)
+class BatchTopicMatrix:
+    """Topics of every chat in a batch packed into one matrix.
+
+    Rows of ``matrix`` are the union of the chat indices, deduplicated by
+    topic id. ``columns[g]`` maps the rows of the g-th chat index to rows of
+    ``matrix`` and ``mask`` marks, per message, the topics bound to its
+    chat, so a whole batch is scored with a single GEMM.
+    """
+
+    topic_ids: np.ndarray
+    thresholds: np.ndarray
+    matrix: np.ndarray
+    topics: list[Topic]
+    columns: list[np.ndarray]
+    mask: np.ndarray
+
+    @classmethod
+    def build(
+        cls,
+        indices: list[ChatTopicIndex],
+        message_counts: list[int],
+    ) -> "BatchTopicMatrix":
+        column_of: dict[int, int] = {}
+        sources: list[tuple[ChatTopicIndex, int]] = []
+        columns = []
+        for index in indices:
+            chat_columns = []
+            for row, topic_id in enumerate(index.topic_ids.tolist()):
+                if topic_id not in column_of:
+                    column_of[topic_id] = len(sources)
+                    sources.append((index, row))
+                chat_columns.append(column_of[topic_id])
+            columns.append(np.array(chat_columns, dtype=np.intp))
+
+        mask = np.zeros((sum(message_counts), len(sources)), dtype=bool)
+        offset = 0
+        for chat_columns, count in zip(columns, message_counts):
+            mask[offset : offset + count, chat_columns] = True
+            offset += count
+
+        return cls(
+            topic_ids=np.array(
+                [index.topic_ids[row] for index, row in sources],
+                dtype=np.int64,
+            ),
+            thresholds=np.array(
+                [index.thresholds[row] for index, row in sources],
+                dtype=np.float32,
+            ),
+            matrix=np.ascontiguousarray(
+                np.stack([index.matrix[row] for index, row in sources]),
+            ),
+            topics=[index.topics[row] for index, row in sources],
+            columns=columns,
+            mask=mask,
+        )
@@ -0,0 +1,122 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import structlog
+from redis.asyncio import Redis
+
+# Rough size of the key and the Python objects wrapping an entry
+ENTRY_OVERHEAD = 256
+
+
+class MessageEmbeddingCache:
+    """LRU cache of message embeddings keyed by a hash of the exact text.
+
+    Forwarded posts, spam waves and cross-posted announcements produce many
+    identical texts, so their embeddings are reused instead of running the
+    encoder again. Entries live in an in-process LRU bounded by
+    ``max_bytes`` and, when a Redis client is given, are shared with other
+    replicas with a TTL.
+    Redis errors are logged and treated as misses.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: int,
+        model_id: str,
+        logger: structlog.typing.FilteringBoundLogger,
+        redis: Redis | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.model_id = model_id
+        self.logger = logger
+        self.redis = redis
+
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, text: str) -> str:
+        # The encoder sees the exact text, so only identical texts share a key
+        digest = hashlib.sha256(f"{self.model_id}\0{text}".encode()).hexdigest()
+        return f"message_embedding:{digest}"
+
+    async def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found = {}
+        remote_keys = []
+        for key in keys:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                remote_keys.append(key)
+                continue
+            self._entries.move_to_end(key)
+            found[key] = embedding
+        self.hits += len(found)
+
+        if remote_keys and self.redis is not None:
+            try:
+                values = await self.redis.mget(remote_keys)
+            except Exception as e:
+                self.logger.exception("message_cache_redis_get_error", error=str(e))
+                values = []
+            for key, value in zip(remote_keys, values):
+                if value is None:
+                    continue
+                embedding = np.frombuffer(value, dtype=np.float32)
+                self._put_local(key, embedding)
+                found[key] = embedding
+                self.redis_hits += 1
+
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, embeddings: dict[str, np.ndarray]) -> None:
+        for key, embedding in embeddings.items():
+            self._put_local(key, np.asarray(embedding, dtype=np.float32))
+
+        if embeddings and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, embedding in embeddings.items():
+                        pipe.set(
+                            key,
+                            np.asarray(embedding, dtype=np.float32).tobytes(),
+                            ex=self.ttl,
+                        )
+                    await pipe.execute()
+            except Exception as e:
+                self.logger.exception("message_cache_redis_set_error", error=str(e))
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.redis_hits) / lookups, 4)
+            if lookups
+            else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def _put_local(self, key: str, embedding: np.ndarray) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.current_bytes -= previous.nbytes + ENTRY_OVERHEAD
+        self._entries[key] = embedding
+        self.current_bytes += embedding.nbytes + ENTRY_OVERHEAD
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes + ENTRY_OVERHEAD
@@ -1,138 +1,361 @@
-from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
+import sys
+from datetime import timedelta
+from pathlib import Path
 
 import numpy as np
-import onnxruntime as ort
 import structlog
-from scipy.spatial.distance import cdist
-from tokenizers import Tokenizer
+from redis.asyncio import Redis
+from tokenizers import Encoding, Tokenizer
 
 from src.core import settings
-from src.domain import Topic
+from src.domain import CacheEventType, CacheInvalidationEvent, Topic
 from src.infrastructure import get_topic_repository
 
+from .cache import TopicEmbeddingCache
+from .executor import InferenceExecutor, external_data_path
+from .index import ChatTopicIndex, normalize
+from .message_cache import MessageEmbeddingCache
+from .store import TopicEmbeddingStore
+
+# Rough size of the Python objects wrapping a cache entry or a topic
+CACHE_ENTRY_OVERHEAD = 512
+# Characters per subword token, on the low side for Cyrillic text
+CHARS_PER_TOKEN = 3
+
+
+def model_fingerprint(model_path: Path) -> str:
+    """Hash the model graph together with its external weights file."""
+    digest = hashlib.sha256()
+    data_path = external_data_path(model_path)
+    for path in [model_path, data_path] if data_path.exists() else [model_path]:
+        digest.update(path.name.encode())
+        with path.open("rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
 
 class SentenceTransformerService:
-    def __init__(self, logger: structlog.typing.FilteringBoundLogger) -> None:
-        self.tokenizer = Tokenizer.from_file(
-            str(settings.ai_model_dir / "tokenizer.json"),
+    def __init__(
+        self,
+        logger: structlog.typing.FilteringBoundLogger,
+        model_dir: Path | None = None,
+        model_path: Path | None = None,
+        default_threshold: float | None = None,
+    ) -> None:
+        model_dir = model_dir or settings.ai_model_dir
+        model_path = model_path or settings.model_path
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        # Padding is applied per length bucket in _tokenize
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=settings.MAX_SEQ_LENGTH)
+
+        self.logger = logger
+
+        self.executor = InferenceExecutor(
+            model_path,
+            workers=settings.INFERENCE_WORKERS,
+            threads_per_worker=settings.INFERENCE_THREADS,
+            max_pending=settings.INFERENCE_MAX_PENDING,
+            logger=logger,
+            mode=settings.INFERENCE_EXECUTOR,
+            mmap_weights=settings.INFERENCE_MMAP_WEIGHTS,
+            pin_cpus=settings.INFERENCE_PIN_CPUS,
         )
+        # Cache structure: {(user_id, chat_id): ChatTopicIndex}
+        # Entries are invalidated by topic change events, the TTL is a safety net
+        self.cache = TopicEmbeddingCache(
+            max_bytes=settings.TOPIC_CACHE_MAX_BYTES,
+            ttl=timedelta(seconds=settings.TOPIC_CACHE_TTL),
+            logger=logger,
+        )
+
+        model_id = ":".join([
+            settings.EMBEDDING_MODEL,
+            model_path.name,
+            model_fingerprint(model_path),
+        ])
+        self.store: TopicEmbeddingStore | None = None
+        if settings.TOPIC_EMBEDDING_STORE_ENABLED:
+            # Keep the store on a volume when the image is redeployed
+            store_dir = (
+                Path(settings.TOPIC_EMBEDDING_STORE_DIR) / model_dir.name
+                if settings.TOPIC_EMBEDDING_STORE_DIR
+                else model_dir
+            )
+            self.store = TopicEmbeddingStore(
+                store_dir / settings.TOPIC_EMBEDDING_STORE,
+                model_id,
+                logger,
+            )
 
-        providers = ["CPUExecutionProvider"]
-        sess_options = ort.SessionOptions()
-        sess_options.intra_op_num_threads = 4
-        self.session = ort.InferenceSession(
-            str(settings.ai_model_dir / "model.onnx"),
-            sess_options=sess_options,
-            providers=providers,
+        # Scores of different encoders are not comparable, so every model
+        # directory holds thresholds calibrated for its own encoder
+        self.threshold, self.topic_thresholds = self._load_thresholds(
+            model_dir / settings.TOPIC_THRESHOLDS_FILE,
+            settings.SIMILARITY_THRESHOLD
+            if default_threshold is None
+            else default_threshold,
         )
 
-        self.input_name = self.session.get_inputs()[0].name
-        self.attn_name = self.session.get_inputs()[1].name
-        self.output_name = self.session.get_outputs()[0].name
+        self.message_cache: MessageEmbeddingCache | None = None
+        if settings.MESSAGE_CACHE_ENABLED:
+            self.message_cache = MessageEmbeddingCache(
+                max_bytes=settings.MESSAGE_CACHE_MAX_BYTES,
+                ttl=settings.MESSAGE_CACHE_TTL,
+                model_id=model_id,
+                logger=logger,
+                redis=Redis(
+                    host=settings.redis.host,
+                    port=settings.redis.port,
+                    db=settings.redis.db,
+                )
+                if settings.MESSAGE_CACHE_REDIS
+                else None,
+            )
 
-        # Cache structure: {(user_id, chat_id): {"data": embeddings_dict, "timestamp": datetime}}
-        self.cache: dict[tuple, dict] = {}
-        self.cache_ttl = timedelta(minutes=30)  # Cache time-to-live
-        self.logger = logger
         self.logger.info(
             "initialized_sentence_transformer",
-            model_path=str(settings.ai_model_dir),
+            model_path=str(model_path),
         )
 
-    def _is_cache_stale(self, cache_entry: dict) -> bool:
-        """Check if a cache entry is stale based on its timestamp."""
-        if not cache_entry or "timestamp" not in cache_entry:
-            return True
-        return datetime.now() - cache_entry["timestamp"] > self.cache_ttl
-
     def invalidate_cache(self, user_id: int, chat_id: int) -> None:
         """Invalidate cache for specific user and chat."""
-        key = (user_id, chat_id)
-        if key in self.cache:
-            del self.cache[key]
+        if self.cache.invalidate((user_id, chat_id)):
             self.logger.info(
                 "cache_invalidated",
                 user_id=user_id,
                 chat_id=chat_id,
             )
 
+    def invalidate_topic(self, topic_id: int) -> None:
+        """Invalidate cache entries of every chat the topic is bound to."""
+        num_entries = self.cache.invalidate_where(lambda index: topic_id in index)
+        self.logger.info(
+            "topic_cache_invalidated",
+            topic_id=topic_id,
+            num_entries=num_entries,
+        )
+
+    def handle_cache_event(self, event: CacheInvalidationEvent) -> None:
+        if event.event == CacheEventType.CHAT_TOPICS_CHANGED:
+            self.invalidate_cache(event.user_id, event.telegram_chat_id)
+        else:
+            self.invalidate_topic(event.topic_id)
+
     async def get_topic_embeddings(
         self,
         user_id: int,
         chat_id: int,
-    ) -> dict[int, tuple[str, np.ndarray, Topic]]:
+    ) -> ChatTopicIndex:
         key = (user_id, chat_id)
-        cache_entry = self.cache.get(key)
+        cached_index = self.cache.get(key)
 
-        if cache_entry and not self._is_cache_stale(cache_entry):
+        if cached_index is not None:
             self.logger.info(
                 "using_cached_embeddings",
                 user_id=user_id,
                 chat_id=chat_id,
             )
-            return cache_entry["data"]
+            return cached_index
 
         self.logger.info("fetching_topics_from_db", user_id=user_id, chat_id=chat_id)
         topics = await self.get_topics_from_db(user_id, chat_id)
 
         if not topics:
             self.logger.warning("no_topics_found", user_id=user_id, chat_id=chat_id)
-            return {}
+            # Chats without topics are cached too until a binding event arrives
+            topic_index = ChatTopicIndex.empty()
+            self.cache.put(key, topic_index, size=self._cache_entry_size(topic_index))
+            return topic_index
 
         topic_data = {t.id: f"{t.description}" for t in topics}
-        texts = list(topic_data.values())
-        self.logger.info("encoding_topics", num_topics=len(texts))
-        embs = self.encode(texts)
-
-        cache_data = dict(zip(topic_data.keys(), zip(texts, embs, topics)))
-        self.cache[key] = {
-            "data": cache_data,
-            "timestamp": datetime.now(),
+        embeddings = await self._load_stored_embeddings(topic_data)
+
+        missing = {
+            tid: text for tid, text in topic_data.items() if tid not in embeddings
         }
+        if missing:
+            self.logger.info("encoding_topics", num_topics=len(missing))
+            encoded = dict(zip(missing, await self.encode(list(missing.values()))))
+            embeddings.update(encoded)
+            if self.store:
+                await asyncio.to_thread(
+                    self.store.put_many,
+                    {tid: (missing[tid], emb) for tid, emb in encoded.items()},
+                )
+
+        topic_index = ChatTopicIndex.build(
+            topics,
+            embeddings,
+            self.threshold,
+            self.topic_thresholds,
+        )
+        self.cache.put(key, topic_index, size=self._cache_entry_size(topic_index))
         self.logger.info(
             "cached_topic_embeddings",
             user_id=user_id,
             chat_id=chat_id,
-            num_topics=len(cache_data),
+            num_topics=len(topic_index),
+            **self.cache.stats(),
+        )
+        return topic_index
+
+    def _load_thresholds(
+        self,
+        path: Path,
+        default_threshold: float,
+    ) -> tuple[float, dict[int, float]]:
+        """Load calibrated thresholds written by scripts/calibrate_thresholds.py."""
+        if not path.exists():
+            self.logger.info(
+                "topic_thresholds_not_found",
+                path=str(path),
+                default_threshold=default_threshold,
+            )
+            return default_threshold, {}
+        data = json.loads(path.read_text(encoding="utf-8"))
+        topic_thresholds = {
+            int(topic_id): float(threshold)
+            for topic_id, threshold in data.get("topics", {}).items()
+        }
+        self.logger.info(
+            "loaded_topic_thresholds",
+            path=str(path),
+            num_topics=len(topic_thresholds),
         )
-        return cache_data
+        default = float(data.get("default", default_threshold))
+        return default, topic_thresholds
 
-    def encode(self, texts: list[str]) -> np.ndarray:
+    @staticmethod
+    def _cache_entry_size(topic_index: ChatTopicIndex) -> int:
+        size = CACHE_ENTRY_OVERHEAD + topic_index.nbytes
+        for topic in topic_index.topics:
+            size += CACHE_ENTRY_OVERHEAD + sum(
+                sys.getsizeof(value)
+                for value in (topic.name, topic.description, topic.prompt)
+            )
+        return size
+
+    async def _load_stored_embeddings(
+        self,
+        topic_data: dict[int, str],
+    ) -> dict[int, np.ndarray]:
+        if not self.store:
+            return {}
+        embeddings = await asyncio.to_thread(self.store.get_many, topic_data)
+        self.logger.info(
+            "loaded_stored_topic_embeddings",
+            requested=len(topic_data),
+            found=len(embeddings),
+        )
+        return embeddings
+
+    def count_tokens(self, text: str) -> int:
+        """Estimate the token count of a text without running the tokenizer.
+
+        Used for batch token budgets on the event loop, the exact count
+        comes from tokenizing the batch in ``encode``.
+        """
+        return min(len(text) // CHARS_PER_TOKEN + 2, settings.MAX_SEQ_LENGTH)
+
+    async def encode(self, texts: list[str]) -> np.ndarray:
         self.logger.info("encoding_texts", num_texts=len(texts))
-        input_ids, attention_mask = self._tokenize(texts)
-
-        outputs = self.session.run(
-            [self.output_name],
-            {
-                self.input_name: input_ids,
-                self.attn_name: attention_mask,
-            },
-        )[0]  # (batch_size, seq_len, hidden_size)
-
-        # mean pooling
-        embeddings = (outputs * np.expand_dims(attention_mask, axis=-1)).sum(
-            axis=1,
-        ) / attention_mask.sum(axis=1, keepdims=True)
-
-        self.logger.info("encoded_texts", num_embeddings=len(embeddings))
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        tokens = self.tokenizer.encode_batch(texts)
+        lengths = np.array([len(t.ids) for t in tokens])
+        # Sort by length so that each bucket is padded to a similar size
+        order = np.argsort(lengths, kind="stable")
+        buckets = self._make_buckets(lengths[order])
+
+        # Buckets are submitted together and run as executor slots free up
+        sorted_embeddings = np.concatenate(
+            await asyncio.gather(*(
+                self.executor.run(
+                    *self._tokenize([tokens[i] for i in order[start:end]]),
+                )
+                for start, end in buckets
+            )),
+        )
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+
+        self.logger.info(
+            "encoded_texts",
+            num_embeddings=len(embeddings),
+            num_buckets=len(buckets),
+        )
         return embeddings
 
+    @staticmethod
+    def _make_buckets(sorted_lengths: np.ndarray) -> list[tuple[int, int]]:
+        """Split ascending token lengths into [start, end) ranges.
+
+        A bucket is closed when adding the next text would exceed either
+        ENCODE_BATCH_SIZE rows or MAX_TOKENS_PER_BATCH padded tokens.
+        """
+        buckets = []
+        start = 0
+        for i, length in enumerate(sorted_lengths):
+            rows = i - start + 1
+            if i > start and (
+                rows > settings.ENCODE_BATCH_SIZE
+                or rows * int(length) > settings.MAX_TOKENS_PER_BATCH
+            ):
+                buckets.append((start, i))
+                start = i
+        buckets.append((start, len(sorted_lengths)))
+        return buckets
+
     async def encode_messages(self, messages: list[str]) -> np.ndarray:
+        """Encode messages into L2-normalized float32 embeddings."""
         self.logger.info("encoding_messages", num_messages=len(messages))
-        return self.encode(messages)
+        if self.message_cache is None or not messages:
+            return normalize(await self.encode(messages))
+
+        keys = [self.message_cache.key(text) for text in messages]
+        embeddings = await self.message_cache.get_many(list(dict.fromkeys(keys)))
+
+        # Identical texts of the batch are encoded once
+        missing = {
+            key: text for key, text in zip(keys, messages) if key not in embeddings
+        }
+        if missing:
+            encoded = dict(
+                zip(missing, normalize(await self.encode(list(missing.values())))),
+            )
+            await self.message_cache.put_many(encoded)
+            embeddings.update(encoded)
+
+        self.logger.info(
+            "message_cache_lookup",
+            num_messages=len(messages),
+            num_encoded=len(missing),
+            **self.message_cache.stats(),
+        )
+        return np.stack([embeddings[key] for key in keys])
+
+    async def close(self) -> None:
+        self.executor.shutdown()
+        if self.message_cache is not None:
+            await self.message_cache.close()
+        if self.store is not None:
+            self.store.close()
 
     @staticmethod
     async def compute_similarity(
         message_embeddings: np.ndarray,
-        topic_embeddings: np.ndarray,
+        topic_matrix: np.ndarray,
     ) -> np.ndarray:
-        # Вычисляем cos_sim с помощью scipy (или вручную)
-        similarity = 1 - cdist(message_embeddings, topic_embeddings, metric="cosine")
-        return similarity
+        # Both sides are L2-normalized, so cosine similarity is a plain GEMM
+        return message_embeddings @ topic_matrix.T
 
-    def _tokenize(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
-        self.logger.debug("tokenizing_texts", num_texts=len(texts))
-        tokens = self.tokenizer.encode_batch(texts)
+    def _tokenize(self, tokens: list[Encoding]) -> tuple[np.ndarray, np.ndarray]:
         max_len = max(len(t.ids) for t in tokens)
 
         input_ids = np.zeros((len(tokens), max_len), dtype=np.int64)
@@ -142,7 +365,11 @@ class SentenceTransformerService:
             input_ids[i, : len(t.ids)] = t.ids
             attn_mask[i, : len(t.attention_mask)] = t.attention_mask
 
-        self.logger.debug("tokenization_complete", max_length=max_len)
+        self.logger.debug(
+            "tokenization_complete",
+            num_texts=len(tokens),
+            max_length=max_len,
+        )
         return input_ids, attn_mask
 
     @staticmethod
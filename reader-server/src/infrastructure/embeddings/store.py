@@ -0,0 +1,93 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import structlog
+
+
+class TopicEmbeddingStore:
+    """Persistent topic embedding store backed by an SQLite blob table.
+
+    Rows are keyed by topic id and a hash of the model id plus the topic
+    description, so an embedding is computed once per description edit and
+    shared by every chat the topic is bound to.
+
+    Methods block on SQLite, callers run them in a worker thread; a lock
+    serializes access to the shared connection.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        model_id: str,
+        logger: structlog.typing.FilteringBoundLogger,
+    ) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS topic_embeddings (
+                topic_id INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (topic_id, content_hash)
+            )
+            """,
+        )
+        self.connection.commit()
+        self.lock = threading.Lock()
+        self.model_id = model_id
+        self.logger = logger
+        self.logger.info("opened_topic_embedding_store", path=str(path))
+
+    def content_hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode()).hexdigest()
+
+    def get_many(self, items: dict[int, str]) -> dict[int, np.ndarray]:
+        """Return stored embeddings for the given {topic_id: text} items."""
+        if not items:
+            return {}
+        keys = [(topic_id, self.content_hash(text)) for topic_id, text in items.items()]
+        placeholders = ", ".join("(?, ?)" for _ in keys)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT topic_id, dtype, embedding FROM topic_embeddings "
+                f"WHERE (topic_id, content_hash) IN (VALUES {placeholders})",
+                [value for key in keys for value in key],
+            ).fetchall()
+        return {
+            topic_id: np.frombuffer(blob, dtype=np.dtype(dtype))
+            for topic_id, dtype, blob in rows
+        }
+
+    def put_many(self, items: dict[int, tuple[str, np.ndarray]]) -> None:
+        """Store {topic_id: (text, embedding)} items, replacing older versions."""
+        if not items:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM topic_embeddings WHERE topic_id = ?",
+                [(topic_id,) for topic_id in items],
+            )
+            self.connection.executemany(
+                "INSERT INTO topic_embeddings (topic_id, content_hash, dtype, embedding) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        topic_id,
+                        self.content_hash(text),
+                        embedding.dtype.str,
+                        np.ascontiguousarray(embedding).tobytes(),
+                    )
+                    for topic_id, (text, embedding) in items.items()
+                ],
+            )
+        self.logger.info("stored_topic_embeddings", num_topics=len(items))
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
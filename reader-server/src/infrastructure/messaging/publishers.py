@@ -1,13 +1,20 @@
-import json
+import asyncio
+import time
 
 import aio_pika
+import structlog
 
 from src.core import settings
 from src.domain import AnswerTask
 
 
 class AnswerTaskPublisher:
-    def __init__(self, rabbitmq_url: str = settings.rabbitmq.url):
+    def __init__(
+        self,
+        logger: structlog.typing.FilteringBoundLogger,
+        rabbitmq_url: str = settings.rabbitmq.url,
+    ):
+        self.logger = logger
         self.rabbitmq_url = rabbitmq_url
         self.connection = None
         self.channel = None
@@ -16,7 +23,7 @@ class AnswerTaskPublisher:
     async def connect(self):
         if not self.connection:
             self.connection = await aio_pika.connect_robust(self.rabbitmq_url)
-            self.channel = await self.connection.channel()
+            self.channel = await self.connection.channel(publisher_confirms=True)
             self.queue = await self.channel.declare_queue(
                 settings.ANSWER_QUEUE_NAME,
                 durable=True,
@@ -26,6 +33,25 @@ class AnswerTaskPublisher:
         if not self.channel:
             await self.connect()
 
+        await self._publish(task)
+
+    async def send_many(self, tasks: list[AnswerTask]) -> None:
+        """Publish tasks concurrently and wait for all broker confirms."""
+        if not tasks:
+            return
+        if not self.channel:
+            await self.connect()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(self._publish(task) for task in tasks))
+        self.logger.info(
+            "published_answer_tasks",
+            num_tasks=len(tasks),
+            latency_ms=round((time.perf_counter() - started) * 1000, 2),
+        )
+
+    async def _publish(self, task: AnswerTask) -> None:
+        # Resolves once the broker confirms the message
         await self.channel.default_exchange.publish(
             aio_pika.Message(
                 body=task.model_dump_json().encode(),
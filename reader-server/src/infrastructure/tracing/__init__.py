@@ -0,0 +1,7 @@
+"""
+Tracing module containing sinks for matcher diagnostics.
+"""
+
+from .sink import SimilarityTraceSink
+
+__all__ = ["SimilarityTraceSink"]
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import structlog
+
+from src.domain import Message
+
+# Entries drained from the queue per file write
+WRITE_BATCH_SIZE = 512
+
+
+class SimilarityTraceSink:
+    """Sampled, append-only JSONL log of message-to-topic similarity scores.
+
+    ``record`` only samples messages and enqueues entries; a background task
+    appends them to ``similarity_<date>_<n>.jsonl`` files off the event loop.
+    Files rotate daily and once they exceed ``max_bytes``, and only the
+    newest ``backup_count`` files are kept. When the bounded queue is full,
+    new entries are dropped and counted instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: float,
+        max_bytes: int,
+        backup_count: int,
+        queue_size: int,
+        logger: structlog.typing.FilteringBoundLogger,
+    ) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.logger = logger
+
+        self.queue: asyncio.Queue[dict | None] = asyncio.Queue(maxsize=queue_size)
+        self.writer_task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+        self._path: Path | None = None
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.writer_task = asyncio.create_task(self._run())
+        self.logger.info(
+            "similarity_trace_started",
+            directory=str(self.directory),
+            sample_rate=self.sample_rate,
+        )
+
+    def record(
+        self,
+        user_id: int,
+        chat_id: int,
+        messages: list[Message],
+        similarity_scores: np.ndarray,
+        topic_ids: np.ndarray,
+        stage: str = "main",
+    ) -> None:
+        """Enqueue the scores of a sample of one chat's messages.
+
+        ``stage`` tells which encoder produced the scores: ``main`` for the
+        large model and ``cascade`` for the small one.
+        """
+        topic_id_list = topic_ids.tolist()
+        for message, scores in zip(messages, similarity_scores):
+            if random.random() >= self.sample_rate:
+                continue
+            entry = {
+                "stage": stage,
+                "created_at": message.created_at.isoformat(),
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "message_id": message.telegram_message_id,
+                "message_text": message.text,
+                "topic_ids": topic_id_list,
+                "scores": np.round(scores, 5).tolist(),
+            }
+            try:
+                self.queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def close(self) -> None:
+        if self.writer_task is None:
+            return
+        await self.queue.put(None)
+        await self.writer_task
+        self.logger.info(
+            "similarity_trace_stopped",
+            written=self.written,
+            dropped=self.dropped,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            entries = [await self.queue.get()]
+            while len(entries) < WRITE_BATCH_SIZE and not self.queue.empty():
+                entries.append(self.queue.get_nowait())
+
+            closing = None in entries
+            entries = [entry for entry in entries if entry is not None]
+            if entries:
+                try:
+                    await asyncio.to_thread(self._write, entries)
+                    self.written += len(entries)
+                except Exception as e:
+                    self.logger.exception(
+                        "similarity_trace_write_error",
+                        num_entries=len(entries),
+                        error=str(e),
+                    )
+            if closing:
+                return
+
+    def _write(self, entries: list[dict]) -> None:
+        data = "".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries
+        ).encode()
+        path = self._current_path(len(data))
+        with path.open("ab") as f:
+            f.write(data)
+
+    def _current_path(self, size: int) -> Path:
+        prefix = f"similarity_{datetime.now().strftime('%Y%m%d')}_"
+        if self._path is None or not self._path.name.startswith(prefix):
+            existing = sorted(self.directory.glob(f"{prefix}*.jsonl"))
+            self._path = existing[-1] if existing else self.directory / (
+                f"{prefix}000.jsonl"
+            )
+
+        if self._path.exists() and self._path.stat().st_size + size > self.max_bytes:
+            index = int(self._path.stem.rsplit("_", 1)[1]) + 1
+            self._path = self.directory / f"{prefix}{index:03d}.jsonl"
+
+        if not self._path.exists():
+            self._prune()
+        return self._path
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("similarity_*.jsonl"))
+        # The file about to be created counts towards the limit
+        for path in files[: max(len(files) - self.backup_count + 1, 0)]:
+            path.unlink(missing_ok=True)
+            self.logger.info("similarity_trace_rotated_out", file_path=str(path))
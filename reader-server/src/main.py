@@ -4,32 +4,101 @@ import json
 import aio_pika
 import structlog
 
-from src.application import BatchCollector, MessageProcessor
+from src.application import BatchCollector, MessageFilter, MessageProcessor
 from src.core import settings
-from src.domain import Message
-from src.infrastructure import AnswerTaskPublisher, SentenceTransformerService
+from src.domain import CacheInvalidationEvent, Message
+from src.infrastructure import (
+    AnswerTaskPublisher,
+    SentenceTransformerService,
+    SimilarityTraceSink,
+)
 
 logger = structlog.get_logger()
 
 
+# Tasks acknowledging messages once their batch has been processed
+pending_settlements: set[asyncio.Task] = set()
+
+
 async def process_message(
     message: aio_pika.IncomingMessage,
     batcher: BatchCollector,
+    message_filter: MessageFilter | None,
+) -> None:
+    try:
+        msg_data = json.loads(message.body.decode())
+        msg = Message(**msg_data)
+        logger.info(
+            "processing_message",
+            message_id=msg.telegram_message_id,
+            user_id=msg.user_id,
+            chat_id=msg.chat_id,
+        )
+        if message_filter is not None and not message_filter.accept(msg):
+            await message.ack()
+            return
+        if not settings.ACK_AFTER_PROCESSING:
+            await message.ack()
+        processed = await batcher.add(msg)
+    except Exception as e:
+        logger.exception(
+            "message_processing_error",
+            error=str(e),
+            body=message.body.decode(),
+        )
+        if not message.processed:
+            await message.reject()
+        raise
+
+    # Settle in a separate task so that the consumer keeps feeding the batch
+    task = asyncio.create_task(settle_message(message, processed))
+    pending_settlements.add(task)
+    task.add_done_callback(pending_settlements.discard)
+
+
+async def settle_message(
+    message: aio_pika.IncomingMessage,
+    processed: asyncio.Future[None],
+) -> None:
+    """Ack the message once its batch is processed or nack it on failure.
+
+    A message that fails again after redelivery is dropped instead of
+    being requeued forever.
+    """
+    try:
+        await processed
+    except Exception:
+        if not message.processed:
+            await message.nack(requeue=not message.redelivered)
+            logger.warning(
+                "message_nacked",
+                message_tag=message.delivery_tag,
+                requeue=not message.redelivered,
+            )
+        return
+    if not message.processed:
+        await message.ack()
+
+
+async def process_cache_event(
+    message: aio_pika.IncomingMessage,
+    embedding_services: list[SentenceTransformerService],
 ) -> None:
     async with message.process():
         try:
-            msg_data = json.loads(message.body.decode())
-            msg = Message(**msg_data)
+            event = CacheInvalidationEvent.model_validate_json(message.body)
             logger.info(
-                "processing_message",
-                message_id=msg.telegram_message_id,
-                user_id=msg.user_id,
-                chat_id=msg.chat_id,
+                "processing_cache_event",
+                cache_event=event.event,
+                user_id=event.user_id,
+                topic_id=event.topic_id,
+                chat_id=event.telegram_chat_id,
             )
-            await batcher.add(msg)
+            for embedding_service in embedding_services:
+                embedding_service.handle_cache_event(event)
         except Exception as e:
             logger.exception(
-                "message_processing_error",
+                "cache_event_processing_error",
                 error=str(e),
                 body=message.body.decode(),
             )
@@ -38,43 +107,110 @@ async def process_message(
 
 async def main() -> None:
     logger.info("starting_application")
+    embedding_services: list[SentenceTransformerService] = []
+    batcher: BatchCollector | None = None
+    trace_sink: SimilarityTraceSink | None = None
     try:
         # Initialize services
         logger.info("initializing_services")
         embedding_service = SentenceTransformerService(logger)
-        publisher = AnswerTaskPublisher()
+        embedding_services.append(embedding_service)
+        cascade_service = None
+        if settings.CASCADE_ENABLED:
+            cascade_dir = settings.ai_model_dir / settings.CASCADE_MODEL_DIR
+            cascade_service = SentenceTransformerService(
+                logger,
+                model_dir=cascade_dir,
+                model_path=cascade_dir / "model.onnx",
+                default_threshold=settings.CASCADE_SIMILARITY_THRESHOLD,
+            )
+            embedding_services.append(cascade_service)
+        publisher = AnswerTaskPublisher(logger)
         await publisher.connect()
         logger.info("services_initialized")
 
-        message_processor = MessageProcessor(embedding_service, publisher, logger)
+        if settings.SIMILARITY_TRACE_ENABLED:
+            trace_sink = SimilarityTraceSink(
+                settings.ai_model_dir / settings.SIMILARITY_TRACE_DIR,
+                sample_rate=settings.SIMILARITY_TRACE_SAMPLE_RATE,
+                max_bytes=settings.SIMILARITY_TRACE_MAX_BYTES,
+                backup_count=settings.SIMILARITY_TRACE_BACKUP_COUNT,
+                queue_size=settings.SIMILARITY_TRACE_QUEUE_SIZE,
+                logger=logger,
+            )
+            trace_sink.start()
+
+        message_processor = MessageProcessor(
+            embedding_service,
+            publisher,
+            logger,
+            cascade_service=cascade_service,
+            trace_sink=trace_sink,
+        )
 
         # Initialize batch processing
         logger.info(
             "initializing_batch_processing",
             batch_size=settings.BATCH_SIZE,
+            batch_max_size=settings.BATCH_MAX_SIZE,
+            batch_max_tokens=settings.BATCH_MAX_TOKENS,
             batch_time=settings.BATCH_TIME,
+            batch_idle_time=settings.BATCH_IDLE_TIME,
+            batch_max_in_flight=settings.BATCH_MAX_IN_FLIGHT,
         )
         batcher = BatchCollector(
             settings.BATCH_SIZE,
             settings.BATCH_TIME,
             message_processor.process_messages,
             logger,
+            max_batch_size=settings.BATCH_MAX_SIZE,
+            max_tokens=settings.BATCH_MAX_TOKENS,
+            idle_time=settings.BATCH_IDLE_TIME,
+            token_counter=embedding_service.count_tokens,
+            max_in_flight=settings.BATCH_MAX_IN_FLIGHT,
         )
 
+        message_filter = None
+        if settings.PREFILTER_ENABLED:
+            message_filter = MessageFilter(
+                settings.PREFILTER_MIN_TOKENS,
+                settings.PREFILTER_SCRIPTS,
+                settings.PREFILTER_MIN_SCRIPT_RATIO,
+                logger,
+            )
+
         # Setup RabbitMQ
         logger.info("connecting_to_rabbitmq", url=settings.rabbitmq.url)
         connection = await aio_pika.connect_robust(settings.rabbitmq.url)
         channel = await connection.channel()
+        if settings.ACK_AFTER_PROCESSING:
+            # Unacked messages wait in the batch buffer, so the prefetch window
+            # must hold every batch that can be buffered or in flight
+            prefetch_count = settings.BATCH_MAX_SIZE * settings.PREFETCH_MULTIPLIER
+            await channel.set_qos(prefetch_count=prefetch_count)
+            logger.info("consumer_prefetch_set", prefetch_count=prefetch_count)
         queue = await channel.declare_queue(
             settings.MESSAGE_QUEUE_NAME,
             durable=True,
         )
+        # Every replica drops its own cache, so each one binds a private
+        # queue to the fanout exchange the bot publishes events to
+        cache_exchange = await channel.declare_exchange(
+            settings.CACHE_INVALIDATION_EXCHANGE_NAME,
+            aio_pika.ExchangeType.FANOUT,
+            durable=True,
+        )
+        cache_queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await cache_queue.bind(cache_exchange)
         logger.info("rabbitmq_connected")
 
         # Start consuming messages
         logger.info("starting_message_consumption")
         await queue.consume(
-            lambda message: process_message(message, batcher),
+            lambda message: process_message(message, batcher, message_filter),
+        )
+        await cache_queue.consume(
+            lambda message: process_cache_event(message, embedding_services),
         )
         logger.info("message_consumption_started")
 
@@ -82,6 +218,14 @@ async def main() -> None:
     except Exception as e:
         logger.exception("application_error", error=str(e))
         raise
+    finally:
+        if batcher is not None:
+            await batcher.close()
+        await asyncio.gather(*pending_settlements, return_exceptions=True)
+        if trace_sink is not None:
+            await trace_sink.close()
+        for embedding_service in embedding_services:
+            await embedding_service.close()
 
 
 if __name__ == "__main__":
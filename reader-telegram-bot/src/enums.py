@@ -20,6 +20,12 @@ class ErrorCode(str, Enum):
     PASSWORD_REQUIRED = "PASSWORD_REQUIRED"
 
 
+class ServerCacheEvent(str, Enum):
+    TOPIC_UPDATED = "topic_updated"
+    TOPIC_DELETED = "topic_deleted"
+    CHAT_TOPICS_CHANGED = "chat_topics_changed"
+
+
 class RabbitMQQueuePublisher(str, Enum):
     # Registration queues
     REGISTRATION_INIT = "registration.init"
@@ -31,7 +37,9 @@ class RabbitMQQueuePublisher(str, Enum):
     CLIENT_STOP = "telegram.client.stop"
     CLIENT_CHAT_LIST = "telegram.client.chat.list.get"
 
-    # Server queues
+
+class RabbitMQExchange(str, Enum):
+    # Fanout exchanges, every reader-server replica binds its own queue
     SERVER_CACHE_INVALIDATION = "server.cache.invalidation"
 
 
@@ -2,10 +2,11 @@ from aiogram import types
 from aiogram.fsm.context import FSMContext
 
 from src.db.repositories import ChatRepository, ChatTopicRepository, TopicRepository
-from src.enums import RabbitMQQueuePublisher
+from src.enums import RabbitMQExchange, ServerCacheEvent
 from src.keyboards.inline import callbacks
 from src.keyboards.inline.user import HandleButtons, TopicButtons
 from src.models.database import TopicDB
+from src.models.rabbitmq import ServerCacheInvalidation
 from src.rabbitmq.publisher import RabbitMQPublisher
 
 
@@ -126,6 +127,7 @@ async def confirm_binding(
     cb: types.CallbackQuery,
     callback_data: callbacks.HandleChatTopic,
     state: FSMContext,
+    chat_repository: ChatRepository,
     chat_topic_repository: ChatTopicRepository,
     publisher: RabbitMQPublisher,
 ) -> None:
@@ -146,12 +148,17 @@ async def confirm_binding(
         await chat_topic_repository.bind_topics(callback_data.chat_id, to_add)
     if to_remove:
         await chat_topic_repository.unbind_topics(callback_data.chat_id, to_remove)
-        await publisher.publish(
-            payload={
-                "user_id": cb.from_user.id,
-                "chat_id": callback_data.chat_id,
-            },
-            routing_key=RabbitMQQueuePublisher.SERVER_CACHE_INVALIDATION,
+    if to_add or to_remove:
+        # reader-server caches topics by telegram chat id
+        chat = await chat_repository.get(callback_data.chat_id)
+        event = ServerCacheInvalidation(
+            event=ServerCacheEvent.CHAT_TOPICS_CHANGED,
+            user_id=cb.from_user.id,
+            telegram_chat_id=chat.telegram_chat_id,
+        )
+        await publisher.broadcast(
+            payload=event.model_dump(mode="json"),
+            exchange_name=RabbitMQExchange.SERVER_CACHE_INVALIDATION,
         )
 
     await cb.message.delete()
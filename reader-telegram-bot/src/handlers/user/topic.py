@@ -1,11 +1,8 @@
 from aiogram import Bot, types
 from aiogram.fsm.context import FSMContext
 
-from src.db.repositories import (
-    ChatRepository,
-    TopicRepository,
-)
-from src.enums import RabbitMQQueuePublisher
+from src.db.repositories import TopicRepository
+from src.enums import RabbitMQExchange, ServerCacheEvent
 from src.exceptions import DatabaseNotFoundError
 from src.keyboards.inline import user
 from src.keyboards.inline.callbacks import (
@@ -14,6 +11,7 @@ from src.keyboards.inline.callbacks import (
     TopicListCallbackFactory,
 )
 from src.models.database import TopicCreateDB
+from src.models.rabbitmq import ServerCacheInvalidation
 from src.rabbitmq.publisher import RabbitMQPublisher
 from src.states.user import TopicEdit, UserTopic
 
@@ -180,7 +178,6 @@ async def delete_topic(
     callback_data: TopicEditCallbackFactory,
     state: FSMContext,
     bot: Bot,
-    chat_repository: ChatRepository,
     topic_repository: TopicRepository,
     publisher: RabbitMQPublisher,
 ) -> None:
@@ -191,16 +188,16 @@ async def delete_topic(
     topic = await topic_repository.get(callback_data.id)
     await topic_repository.delete(callback_data.id)
 
-    # Invalidate cache for all chats where this topic was used
-    bound_chats = await chat_repository.get_chats_by_topic_id(callback_data.id)
-    for chat in bound_chats:
-        await publisher.publish(
-            payload={
-                "user_id": topic.user_id,
-                "chat_id": chat.id,
-            },
-            routing_key=RabbitMQQueuePublisher.SERVER_CACHE_INVALIDATION,
-        )
+    # reader-server drops the topic from every chat it was bound to
+    event = ServerCacheInvalidation(
+        event=ServerCacheEvent.TOPIC_DELETED,
+        user_id=topic.user_id,
+        topic_id=topic.id,
+    )
+    await publisher.broadcast(
+        payload=event.model_dump(mode="json"),
+        exchange_name=RabbitMQExchange.SERVER_CACHE_INVALIDATION,
+    )
 
     await bot.edit_message_text(
         "🗑️ Тема успешно удалена.",
@@ -248,7 +245,6 @@ async def edit_topic_field(
     msg: types.Message,
     state: FSMContext,
     bot: Bot,
-    chat_repository: ChatRepository,
     topic_repository: TopicRepository,
     publisher: RabbitMQPublisher,
 ) -> None:
@@ -276,14 +272,16 @@ async def edit_topic_field(
             await topic_repository.update_keywords(topic_id, keywords)
             sent_msg = "💡 Ключевые слова темы успешно изменены."
 
-        bound_chats = await chat_repository.get_chats_by_topic_id(topic_id)
-        for chat in bound_chats:
-            await publisher.publish(
-                payload={
-                    "user_id": msg.from_user.id,
-                    "chat_id": chat.id,
-                },
-                routing_key=RabbitMQQueuePublisher.SERVER_CACHE_INVALIDATION,
+        # Keywords are not used by reader-server, other fields are cached there
+        if current_state != TopicEdit.edit_keywords:
+            event = ServerCacheInvalidation(
+                event=ServerCacheEvent.TOPIC_UPDATED,
+                user_id=msg.from_user.id,
+                topic_id=topic_id,
+            )
+            await publisher.broadcast(
+                payload=event.model_dump(mode="json"),
+                exchange_name=RabbitMQExchange.SERVER_CACHE_INVALIDATION,
             )
 
     except DatabaseNotFoundError:
@@ -1,3 +1,4 @@
 from src.models.rabbitmq.client import Chat, ClientChatList
+from src.models.rabbitmq.server import ServerCacheInvalidation
 
-__all__ = ["Chat", "ClientChatList"]
+__all__ = ["Chat", "ClientChatList", "ServerCacheInvalidation"]
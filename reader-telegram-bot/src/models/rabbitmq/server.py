@@ -0,0 +1,12 @@
+from src.enums import ServerCacheEvent
+
+from .base import BaseRabbitMQModel
+
+
+class ServerCacheInvalidation(BaseRabbitMQModel):
+    """Topic change event consumed by reader-server to refresh its caches."""
+
+    event: ServerCacheEvent
+    user_id: int
+    topic_id: int | None = None
+    telegram_chat_id: int | None = None
@@ -1,12 +1,14 @@
 import orjson
-from aio_pika import DeliveryMode, Message, RobustChannel
+from aio_pika import DeliveryMode, ExchangeType, Message, RobustChannel
+from aio_pika.abc import AbstractExchange
 
-from src.enums import RabbitMQQueuePublisher
+from src.enums import RabbitMQExchange, RabbitMQQueuePublisher
 
 
 class RabbitMQPublisher:
     def __init__(self, channel: RobustChannel) -> None:
         self.channel = channel
+        self._exchanges: dict[RabbitMQExchange, AbstractExchange] = {}
 
     async def publish(
         self,
@@ -25,3 +27,25 @@ class RabbitMQPublisher:
             message,
             routing_key=routing_key,
         )
+
+    async def broadcast(
+        self,
+        payload: dict,
+        exchange_name: RabbitMQExchange,
+    ) -> None:
+        """Publish message to every queue bound to a fanout exchange.
+
+        Args:
+            payload: Dictionary with message data
+            exchange_name: Exchange name from RabbitMQExchange enum
+        """
+        exchange = self._exchanges.get(exchange_name)
+        if exchange is None:
+            exchange = await self.channel.declare_exchange(
+                exchange_name,
+                ExchangeType.FANOUT,
+                durable=True,
+            )
+            self._exchanges[exchange_name] = exchange
+        body = orjson.dumps(payload)
+        await exchange.publish(Message(body), routing_key="")
@@ -23,6 +23,8 @@ from src.infrastructure import (
     RabbitMQPublisher,
     RedisClient,
     TelethonClientManager,
+    ThreadActivityBuffer,
+    ThreadIndex,
 )
 from src.models.enums.infrastructure import (
     RabbitMQQueueConsumer,
@@ -145,6 +147,19 @@ class Container(containers.DeclarativeContainer):
     )
 
     # Telegram
+    thread_index = providers.Singleton(
+        ThreadIndex,
+        max_size=config.thread_index.max_size,
+        ttl=config.thread_index.ttl,
+        miss_max_size=config.thread_index.miss_max_size,
+        miss_ttl=config.thread_index.miss_ttl,
+    )
+    thread_activity = providers.Singleton(
+        ThreadActivityBuffer,
+        thread_repository=thread_repository,
+        logger=db_logger,
+        flush_interval=config.thread_activity.flush_interval,
+    )
     client_manager = providers.Singleton(
         TelethonClientManager,
         telegram_auth_repository=telegram_auth_repository,
@@ -152,8 +167,11 @@ class Container(containers.DeclarativeContainer):
         chat_repository=chat_repository,
         user_repository=user_repository,
         message_repository=message_repository,
-        thread_repository=thread_repository,
+        topic_repository=topic_repository,
+        thread_index=thread_index,
+        thread_activity=thread_activity,
         logger=telegram_logger,
+        refresh_interval=config.snapshot_refresh.interval,
     )
     watchdog = providers.Singleton(
         ClientWatchdog,
@@ -198,6 +216,7 @@ class Container(containers.DeclarativeContainer):
         message_repository=message_repository,
         chat_repository=chat_repository,
         thread_repository=thread_repository,
+        thread_index=thread_index,
         openai_client=openai_client,
         logger=service_logger,
     )
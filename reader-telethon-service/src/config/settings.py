@@ -31,6 +31,21 @@ class OpenAISettings(BaseModel):
     proxy: str = "http://localhost:8080"
 
 
+class SnapshotRefreshSettings(BaseModel):
+    interval: int = 60
+
+
+class ThreadIndexSettings(BaseModel):
+    max_size: int = 100_000
+    ttl: int = 86_400
+    miss_max_size: int = 20_000
+    miss_ttl: int = 600
+
+
+class ThreadActivitySettings(BaseModel):
+    flush_interval: int = 5
+
+
 class Settings(BaseSettings):
     debug: bool = True
 
@@ -41,6 +56,9 @@ class Settings(BaseSettings):
     redis: RedisSettings = RedisSettings()
     rabbitmq: RabbitMQSettings = RabbitMQSettings()
     openai: OpenAISettings = OpenAISettings()
+    snapshot_refresh: SnapshotRefreshSettings = SnapshotRefreshSettings()
+    thread_index: ThreadIndexSettings = ThreadIndexSettings()
+    thread_activity: ThreadActivitySettings = ThreadActivitySettings()
     model_config = SettingsConfigDict(env_file=".env")
 
 
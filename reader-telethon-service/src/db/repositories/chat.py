@@ -4,7 +4,7 @@ import structlog
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from src.db.tables import Chat
+from src.db.tables import Chat, ChatTopic, Topic
 from src.models.database import Chat as ChatModel
 from src.models.database import ChatCreate
 
@@ -42,3 +42,25 @@ class ChatRepository(BaseRepository[Chat]):
     async def get_by_telegram_chat_id(self, telegram_chat_id: int) -> ChatModel | None:
         instance = await self._get(key="telegram_chat_id", value=telegram_chat_id)
         return ChatModel.model_validate(instance) if instance else None
+
+    async def get_active_chat_topics(
+        self,
+    ) -> dict[int, dict[int, list[tuple[int, list[str]]]]]:
+        """Return topic keywords of every active chat keyed by user and chat.
+
+        Chats without topics are included with an empty list.
+        """
+        stmt = (
+            select(Chat.user_id, Chat.telegram_chat_id, Topic.id, Topic.keywords)
+            .outerjoin(ChatTopic, ChatTopic.chat_id == Chat.id)
+            .outerjoin(Topic, Topic.id == ChatTopic.topic_id)
+            .where(Chat.is_active == True)
+            .order_by(Chat.user_id, Chat.telegram_chat_id, Topic.id)
+        )
+        result = await self.execute(stmt)
+        snapshot: dict[int, dict[int, list[tuple[int, list[str]]]]] = {}
+        for user_id, telegram_chat_id, topic_id, keywords in result.all():
+            topics = snapshot.setdefault(user_id, {}).setdefault(telegram_chat_id, [])
+            if topic_id is not None:
+                topics.append((topic_id, keywords or []))
+        return snapshot
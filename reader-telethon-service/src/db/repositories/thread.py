@@ -2,7 +2,7 @@ from collections.abc import AsyncGenerator
 from datetime import UTC, datetime
 
 import structlog
-from sqlalchemy import select
+from sqlalchemy import DateTime, Integer, column, func, select, update, values
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from src.db.tables import Chat, Thread
@@ -62,3 +62,43 @@ class ThreadRepository(BaseRepository[Thread]):
         )
 
         return ThreadModel.model_validate(thread)
+
+    async def bulk_update_activity(self, activity: dict[int, datetime]) -> int:
+        """Move last_activity_at of many threads forward in one statement.
+
+        Runs a single ``UPDATE ... FROM (VALUES ...)``; a timestamp older
+        than the stored one is ignored. Returns the number of updated rows.
+        """
+        self.logger.debug("db_bulk_update_activity_called", count=len(activity))
+        activity_values = values(
+            column("id", Integer),
+            column("last_activity_at", DateTime),
+            name="activity",
+        ).data(list(activity.items()))
+        stmt = (
+            update(Thread)
+            .where(Thread.id == activity_values.c.id)
+            .values(
+                last_activity_at=func.greatest(
+                    Thread.last_activity_at,
+                    activity_values.c.last_activity_at,
+                ),
+            )
+        )
+        async with self._session_factory() as session:
+            try:
+                result = await session.execute(stmt)
+                await session.commit()
+            except Exception as e:
+                self.logger.exception(
+                    "db_bulk_update_activity_error",
+                    count=len(activity),
+                    error=str(e),
+                )
+                raise
+        self.logger.debug(
+            "db_bulk_update_activity_success",
+            count=len(activity),
+            updated=result.rowcount,
+        )
+        return result.rowcount
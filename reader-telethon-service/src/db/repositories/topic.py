@@ -43,15 +43,22 @@ class TopicRepository(BaseRepository[Topic]):
         instance = result.scalar_one_or_none()
         return TopicModel.model_validate(instance)
 
-    async def get_by_chat_id(self, chat_id: int, user_id: int) -> list[TopicModel]:
+    async def get_keywords_by_user_id(
+        self,
+        user_id: int,
+    ) -> dict[int, list[tuple[int, list[str]]]]:
+        """Return (topic_id, keywords) of every active chat keyed by chat."""
         stmt = (
-            select(Topic)
+            select(Chat.telegram_chat_id, Topic.id, Topic.keywords)
             .join(ChatTopic, Topic.id == ChatTopic.topic_id)
             .join(Chat, Chat.id == ChatTopic.chat_id)
-            .where(Chat.telegram_chat_id == chat_id)
-            .where(Chat.user_id == user_id),
+            .where(Chat.user_id == user_id, Chat.is_active == True)
+            .order_by(Chat.telegram_chat_id, Topic.id)
         )
         result = await self.execute(stmt)
-        return [
-            TopicModel.model_validate(instance) for instance in result.scalars.all()
-        ]
+        chat_topics: dict[int, list[tuple[int, list[str]]]] = {}
+        for telegram_chat_id, topic_id, keywords in result.all():
+            chat_topics.setdefault(telegram_chat_id, []).append(
+                (topic_id, keywords or []),
+            )
+        return chat_topics
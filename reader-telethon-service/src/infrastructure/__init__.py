@@ -4,6 +4,8 @@ from src.infrastructure.telegram import (
     ClientWatchdog,
     TelethonClientManager,
     TelethonClientWrapper,
+    ThreadActivityBuffer,
+    ThreadIndex,
 )
 
 __all__ = [
@@ -13,4 +15,6 @@ __all__ = [
     "RedisClient",
     "TelethonClientManager",
     "TelethonClientWrapper",
+    "ThreadActivityBuffer",
+    "ThreadIndex",
 ]
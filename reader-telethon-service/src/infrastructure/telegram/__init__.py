@@ -1,9 +1,15 @@
 from src.infrastructure.telegram.client_manager import TelethonClientManager
 from src.infrastructure.telegram.client_wrapper import TelethonClientWrapper
+from src.infrastructure.telegram.keyword_matcher import KeywordMatcher
+from src.infrastructure.telegram.thread_activity import ThreadActivityBuffer
+from src.infrastructure.telegram.thread_index import ThreadIndex
 from src.infrastructure.telegram.watchdog import ClientWatchdog
 
 __all__ = [
     "ClientWatchdog",
+    "KeywordMatcher",
     "TelethonClientManager",
     "TelethonClientWrapper",
+    "ThreadActivityBuffer",
+    "ThreadIndex",
 ]
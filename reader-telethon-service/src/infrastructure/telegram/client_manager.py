@@ -1,10 +1,12 @@
+import asyncio
+
 import structlog
 
 from src.db.repositories import (
     ChatRepository,
     MessageRepository,
     TelegramAuthRepository,
-    ThreadRepository,
+    TopicRepository,
     UserRepository,
 )
 from src.exceptions import ClientNotFoundError
@@ -13,6 +15,8 @@ from src.models.database import TelegramAuth as TelegramAuthModel
 from src.models.domain import ChatModel
 
 from .client_wrapper import TelethonClientWrapper
+from .thread_activity import ThreadActivityBuffer
+from .thread_index import ThreadIndex
 
 
 class TelethonClientManager:
@@ -23,8 +27,11 @@ class TelethonClientManager:
         chat_repository: ChatRepository,
         user_repository: UserRepository,
         message_repository: MessageRepository,
-        thread_repository: ThreadRepository,
+        topic_repository: TopicRepository,
+        thread_index: ThreadIndex,
+        thread_activity: ThreadActivityBuffer,
         logger: structlog.typing.FilteringBoundLogger,
+        refresh_interval: int = 60,
     ) -> None:
         self._registry: dict[int, TelethonClientWrapper] = {}
         self._publisher = publisher
@@ -32,7 +39,10 @@ class TelethonClientManager:
         self._telegram_auth_repository = telegram_auth_repository
         self._user_repository = user_repository
         self._message_repository = message_repository
-        self._thread_repository = thread_repository
+        self._topic_repository = topic_repository
+        self._thread_index = thread_index
+        self._thread_activity = thread_activity
+        self.refresh_interval = refresh_interval
         self.logger = logger
 
     def _create_client(self, auth_model: TelegramAuthModel) -> TelethonClientWrapper:
@@ -48,7 +58,9 @@ class TelethonClientManager:
             publisher=self._publisher,
             chat_repository=self._chat_repository,
             message_repository=self._message_repository,
-            thread_repository=self._thread_repository,
+            topic_repository=self._topic_repository,
+            thread_index=self._thread_index,
+            thread_activity=self._thread_activity,
             logger=self.logger,
         )
 
@@ -141,3 +153,31 @@ class TelethonClientManager:
         if not client:
             raise ClientNotFoundError
         return await client.get_chat_list()
+
+    async def run_snapshot_refresher(self) -> None:
+        """Refresh chats and topic keywords of every client from one query."""
+        self.logger.info(
+            "starting_snapshot_refresher",
+            refresh_interval=self.refresh_interval,
+        )
+        while True:
+            try:
+                await asyncio.sleep(self.refresh_interval)
+                await self.refresh_snapshots()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.exception(
+                    "snapshot_refresher_error",
+                    error=str(e),
+                )
+
+    async def refresh_snapshots(self) -> None:
+        snapshot = await self._chat_repository.get_active_chat_topics()
+        for user_id, client in list(self._registry.items()):
+            client.apply_snapshot(snapshot.get(user_id, {}))
+        self.logger.debug(
+            "snapshots_refreshed",
+            client_count=len(self._registry),
+            user_count=len(snapshot),
+        )
@@ -1,6 +1,3 @@
-import asyncio
-import re
-
 import structlog
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
@@ -9,13 +6,16 @@ from telethon.tl.patched import Message
 from src.db.repositories import (
     ChatRepository,
     MessageRepository,
-    ThreadRepository,
     TopicRepository,
 )
 from src.infrastructure import RabbitMQPublisher
 from src.models.domain import ChatModel
 from src.models.enums.infrastructure import RabbitMQQueuePublisher
 
+from .keyword_matcher import KeywordMatcher
+from .thread_activity import ThreadActivityBuffer
+from .thread_index import ThreadIndex
+
 
 class TelethonClientWrapper:
     def __init__(
@@ -27,8 +27,9 @@ class TelethonClientWrapper:
         publisher: RabbitMQPublisher,
         chat_repository: ChatRepository,
         message_repository: MessageRepository,
-        thread_repository: ThreadRepository,
         topic_repository: TopicRepository,
+        thread_index: ThreadIndex,
+        thread_activity: ThreadActivityBuffer,
         logger: structlog.typing.FilteringBoundLogger,
     ) -> None:
         self.user_id = user_id
@@ -36,10 +37,14 @@ class TelethonClientWrapper:
         self.publisher = publisher
         self.chat_repository = chat_repository
         self.message_repository = message_repository
-        self.thread_repository = thread_repository
         self.topic_repository = topic_repository
+        self.thread_index = thread_index
+        self.thread_activity = thread_activity
         self.background_tasks = set()
         self.allowed_chat_ids: set[int] = set()
+        # Snapshot of topic keywords per chat, the hot path never queries topics
+        # {telegram_chat_id: (topic keywords the matcher was built from, matcher)}
+        self.keyword_matchers: dict[int, tuple[tuple, KeywordMatcher]] = {}
         self.logger = logger
 
     async def start(self) -> None:
@@ -55,12 +60,9 @@ class TelethonClientWrapper:
 
         self.register_handlers()
         await self.update_chat_ids()
+        await self.update_topics()
         self.logger.info("client_started", user_id=self.user_id)
 
-        task = asyncio.create_task(self.chat_updater_loop())
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.discard)
-
     def register_handlers(self) -> None:
         self.logger.debug("registering_message_handlers", user_id=self.user_id)
 
@@ -107,43 +109,69 @@ class TelethonClientWrapper:
             # )
             pass
         else:
-            topics = await self.topic_repository.get_by_chat_id()
-            message_text = message_instance.message.lower()
-
-            # Remove punctuation and split into words
-            message_words = set(re.findall(r"\w+", message_text))
-
-            # Check each topic's keywords
-            for topic in topics:
-                if not topic.keywords:
-                    continue
-
-                # Count how many keywords match
-                matching_keywords = 0
-                for keyword in topic.keywords:
-                    # Remove punctuation from keyword and convert to lowercase
-                    clean_keyword = re.findall(r"\w+", keyword.lower())[0]
-                    # Check if keyword is part of any word in the message
-                    if any(clean_keyword in word for word in message_words):
-                        matching_keywords += 1
-
-                # If more than 2 keywords match, process the message
-                if matching_keywords > 0:
-                    await self.publisher.publish(
-                        RabbitMQQueuePublisher.MESSAGE_PROCESS,
-                        message={
-                            "telegram_message_id": message_instance.id,
-                            "user_id": self.user_id,
-                            "chat_id": event.chat_id,
-                            "text": message_instance.message,
-                            "sender_username": sender.username,
-                            "sender_id": sender.id,
-                            "created_at": message_instance.date,
-                            "topic_id": topic.id,
-                            "score": float(matching_keywords),
-                        },
-                    )
-                    break
+            snapshot = self.keyword_matchers.get(event.chat_id)
+            if snapshot is None:
+                return
+
+            # The first topic with at least one keyword found in the message
+            matches = snapshot[1].match(message_instance.message)
+            if matches:
+                topic_id, matching_keywords = matches[0]
+                await self.publisher.publish(
+                    RabbitMQQueuePublisher.MESSAGE_PROCESS,
+                    message={
+                        "telegram_message_id": message_instance.id,
+                        "user_id": self.user_id,
+                        "chat_id": event.chat_id,
+                        "text": message_instance.message,
+                        "sender_username": sender.username,
+                        "sender_id": sender.id,
+                        "created_at": message_instance.date,
+                        "topic_id": topic_id,
+                        "score": float(matching_keywords),
+                    },
+                )
+
+    def set_chat_topics(
+        self,
+        chat_topics: dict[int, list[tuple[int, list[str]]]],
+    ) -> None:
+        """Replace the topic snapshot, rebuilding matchers of changed chats."""
+        keyword_matchers = {}
+        rebuilt = 0
+        for chat_id, topics in chat_topics.items():
+            topic_keywords = tuple(
+                (topic_id, tuple(keywords)) for topic_id, keywords in topics
+            )
+            cached = self.keyword_matchers.get(chat_id)
+            if cached and cached[0] == topic_keywords:
+                keyword_matchers[chat_id] = cached
+                continue
+            keyword_matchers[chat_id] = (topic_keywords, KeywordMatcher(topic_keywords))
+            rebuilt += 1
+
+        removed = len(self.keyword_matchers.keys() - keyword_matchers.keys())
+        self.keyword_matchers = keyword_matchers
+        if rebuilt or removed:
+            self.logger.debug(
+                "keyword_matchers_updated",
+                user_id=self.user_id,
+                chat_count=len(keyword_matchers),
+                rebuilt=rebuilt,
+                removed=removed,
+            )
+
+    async def load_thread_id(self, chat_id: int, message_id: int) -> int | None:
+        chat = await self.chat_repository.get_by_telegram_chat_id(chat_id)
+        if not chat:
+            return None
+        message = await self.message_repository.get_by_telegram_id(
+            message_id,
+            chat.id,
+        )
+        if message and message.thread_id:
+            return message.thread_id
+        return None
 
     async def find_existing_thread_id(
         self,
@@ -153,16 +181,19 @@ class TelethonClientWrapper:
     ) -> int | None:
         # 1. Try to find the message being replied to
         if reply_to_msg_id:
-            chat = await self.chat_repository.get_by_telegram_chat_id(chat_id)
-            message = await self.message_repository.get_by_telegram_id(
-                reply_to_msg_id,
-                chat.id,
-            )
-            if message and message.thread_id:
+            found, thread_id = self.thread_index.get(chat_id, reply_to_msg_id)
+            if not found:
+                thread_id = await self.load_thread_id(chat_id, reply_to_msg_id)
+                self.thread_index.put(
+                    chat_id,
+                    reply_to_msg_id,
+                    thread_id,
+                    replace=False,
+                )
+            if thread_id:
                 # Update thread activity since we're continuing the conversation
-                await self.thread_repository.update_activity(message.thread_id)
-                return message.thread_id
-            return None
+                self.thread_activity.touch(thread_id)
+            return thread_id
 
         # 2. Try to find an active thread with the same initiator
         # active_threshold = (datetime.now(UTC) - timedelta(seconds=5)).replace(
@@ -178,18 +209,23 @@ class TelethonClientWrapper:
         #     return active_thread.id
         return None
 
-    async def chat_updater_loop(self) -> None:
-        self.logger.debug("starting_chat_updater_loop", user_id=self.user_id)
-        while True:
-            try:
-                await self.update_chat_ids()
-                await asyncio.sleep(60)
-            except Exception as e:
-                self.logger.exception(
-                    "chat_updater_loop_error",
-                    user_id=self.user_id,
-                    error=str(e),
-                )
+    def apply_snapshot(
+        self,
+        chat_topics: dict[int, list[tuple[int, list[str]]]],
+    ) -> None:
+        """Apply the manager's snapshot of this user's active chats."""
+        chat_ids = set(chat_topics)
+        if chat_ids != self.allowed_chat_ids:
+            self.logger.info(
+                "chat_ids_changed",
+                user_id=self.user_id,
+                added=sorted(chat_ids - self.allowed_chat_ids),
+                removed=sorted(self.allowed_chat_ids - chat_ids),
+            )
+            self.allowed_chat_ids = chat_ids
+        self.set_chat_topics(
+            {chat_id: topics for chat_id, topics in chat_topics.items() if topics},
+        )
 
     async def update_chat_ids(self) -> None:
         self.logger.debug("updating_chat_ids", user_id=self.user_id)
@@ -201,6 +237,13 @@ class TelethonClientWrapper:
             chat_count=len(self.allowed_chat_ids),
         )
 
+    async def update_topics(self) -> None:
+        self.logger.debug("updating_topics", user_id=self.user_id)
+        chat_topics = await self.topic_repository.get_keywords_by_user_id(
+            self.user_id,
+        )
+        self.set_chat_topics(chat_topics)
+
     async def stop(self) -> None:
         self.logger.info("stopping_client", user_id=self.user_id)
         for task in self.background_tasks:
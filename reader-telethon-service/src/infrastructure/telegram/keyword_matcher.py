@@ -0,0 +1,101 @@
+import re
+from collections import deque
+from collections.abc import Iterable
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_keyword(keyword: str) -> str | None:
+    """Reduce a keyword to its first lowercase word, its matching stem."""
+    words = _WORD.findall(keyword.lower())
+    return words[0] if words else None
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton over the keyword stems of a chat's topics.
+
+    A stem matches when it occurs inside any word of the lowercased message.
+    Stems consist of word characters only, so every occurrence in the text
+    lies within a single word and the whole message is scanned in one pass,
+    whatever the number of keywords.
+    """
+
+    def __init__(self, topics: Iterable[tuple[int, Iterable[str] | None]]) -> None:
+        self.topic_ids: list[int] = []
+        # Topic positions per stem, once per keyword that normalizes to it
+        self._stem_topics: list[list[int]] = []
+        stem_index: dict[str, int] = {}
+
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[list[int]] = [[]]
+
+        for position, (topic_id, keywords) in enumerate(topics):
+            self.topic_ids.append(topic_id)
+            for keyword in keywords or ():
+                stem = normalize_keyword(keyword)
+                if stem is None:
+                    continue
+                if stem not in stem_index:
+                    stem_index[stem] = len(self._stem_topics)
+                    self._stem_topics.append([])
+                    self._insert(stem, stem_index[stem])
+                self._stem_topics[stem_index[stem]].append(position)
+
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        return len(self._stem_topics)
+
+    def match(self, text: str) -> list[tuple[int, int]]:
+        """Return (topic_id, matched keyword count) in topic order."""
+        if not self._stem_topics:
+            return []
+
+        found: set[int] = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+
+        counts = [0] * len(self.topic_ids)
+        for stem in found:
+            for position in self._stem_topics[stem]:
+                counts[position] += 1
+        return [
+            (topic_id, count)
+            for topic_id, count in zip(self.topic_ids, counts)
+            if count
+        ]
+
+    def _insert(self, stem: str, index: int) -> None:
+        state = 0
+        for char in stem:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(index)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # Stems ending at the fallback state also end here
+                self._output[next_state] = (
+                    self._output[next_state] + self._output[self._fail[next_state]]
+                )
@@ -0,0 +1,71 @@
+import asyncio
+from datetime import UTC, datetime
+
+import structlog
+
+from src.db.repositories import ThreadRepository
+
+
+class ThreadActivityBuffer:
+    """Write-behind buffer for thread last_activity_at updates.
+
+    Messages continuing a thread only record the time in memory, keeping
+    the latest one per thread. The buffer is written every
+    ``flush_interval`` seconds in one bulk update and once more on shutdown,
+    so a busy thread costs one write per interval instead of one per message.
+    """
+
+    def __init__(
+        self,
+        thread_repository: ThreadRepository,
+        logger: structlog.typing.FilteringBoundLogger,
+        flush_interval: int = 5,
+    ) -> None:
+        self.thread_repository = thread_repository
+        self.flush_interval = flush_interval
+        self._activity: dict[int, datetime] = {}
+        self._lock = asyncio.Lock()
+        self.logger = logger
+
+    def touch(self, thread_id: int, at: datetime | None = None) -> None:
+        at = at or datetime.now(UTC).replace(tzinfo=None)
+        current = self._activity.get(thread_id)
+        if current is None or at > current:
+            self._activity[thread_id] = at
+
+    async def run(self) -> None:
+        self.logger.info(
+            "starting_thread_activity_flusher",
+            flush_interval=self.flush_interval,
+        )
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.exception(
+                    "thread_activity_flush_error",
+                    error=str(e),
+                )
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._activity:
+                return
+            activity, self._activity = self._activity, {}
+            try:
+                updated = await self.thread_repository.bulk_update_activity(activity)
+            except BaseException:
+                # Keep the timestamps for the next flush, newer ones win. A
+                # cancelled update may have committed, writing it twice is
+                # harmless as the update never moves timestamps back
+                for thread_id, at in activity.items():
+                    self.touch(thread_id, at)
+                raise
+        self.logger.debug(
+            "thread_activity_flushed",
+            thread_count=len(activity),
+            updated=updated,
+        )
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+
+
+class _ExpiringLRU:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        # {key: (value, expires_at)}
+        self._entries: OrderedDict[tuple[int, int], tuple[int | None, float]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple[int, int]) -> tuple[bool, int | None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: tuple[int, int], value: int | None) -> None:
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[int, int]) -> None:
+        self._entries.pop(key, None)
+
+
+class ThreadIndex:
+    """LRU index of (telegram_chat_id, telegram_message_id) -> thread_id.
+
+    Filled whenever a message of a thread is saved, so replies to the bot's
+    answers and to tracked messages are resolved without querying the
+    database. Lookups that went to the database are remembered too. Misses,
+    which most replies in busy chats are, live in a separate smaller LRU
+    with a short TTL, so they never evict thread entries.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        ttl: float = 86_400,
+        miss_max_size: int = 20_000,
+        miss_ttl: float = 600,
+    ) -> None:
+        self._threads = _ExpiringLRU(max_size, ttl)
+        self._misses = _ExpiringLRU(miss_max_size, miss_ttl)
+
+    def __len__(self) -> int:
+        return len(self._threads) + len(self._misses)
+
+    def get(self, chat_id: int, message_id: int) -> tuple[bool, int | None]:
+        """Return whether the message is indexed and its thread id."""
+        key = (chat_id, message_id)
+        found, thread_id = self._threads.get(key)
+        if found:
+            return found, thread_id
+        return self._misses.get(key)
+
+    def put(
+        self,
+        chat_id: int,
+        message_id: int,
+        thread_id: int | None,
+        replace: bool = True,
+    ) -> None:
+        """Index the message; ``replace=False`` keeps an existing entry.
+
+        Lookups store their database result with ``replace=False``, so a
+        message saved while the lookup was running is not overwritten.
+        """
+        key = (chat_id, message_id)
+        if not replace and self.get(chat_id, message_id)[0]:
+            return
+        if thread_id is None:
+            self._threads.discard(key)
+            self._misses.put(key, None)
+        else:
+            self._misses.discard(key)
+            self._threads.put(key, thread_id)
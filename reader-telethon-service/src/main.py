@@ -36,6 +36,7 @@ async def start_consumers(container: Container) -> None:
 
 async def shutdown(container: Container) -> None:
     await container.client_manager().stop_all_clients()
+    await container.thread_activity().flush()
 
     await container.registration_consumer().close()
     await container.message_consumer().close()
@@ -55,6 +56,10 @@ async def main() -> None:
     await container.client_manager().start_all_clients()
 
     watchdog_task = asyncio.create_task(container.watchdog().run())
+    refresher_task = asyncio.create_task(
+        container.client_manager().run_snapshot_refresher(),
+    )
+    activity_task = asyncio.create_task(container.thread_activity().run())
 
     shutdown_event = anyio.Event()
 
@@ -73,6 +78,10 @@ async def main() -> None:
         await shutdown_event.wait()
     finally:
         watchdog_task.cancel()
+        refresher_task.cancel()
+        activity_task.cancel()
+        # Let a running flush settle before the final one
+        await asyncio.gather(activity_task, return_exceptions=True)
         await shutdown(container)
 
 
@@ -9,6 +9,7 @@ class TopicBase(BaseModel):
     name: str
     description: str | None = None
     prompt: str | None = None
+    keywords: list[str] | None = None
     user_id: int
 
 
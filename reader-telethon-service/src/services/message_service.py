@@ -9,7 +9,7 @@ from src.db.repositories import (
     ThreadRepository,
     TopicRepository,
 )
-from src.infrastructure import TelethonClientManager
+from src.infrastructure import TelethonClientManager, ThreadIndex
 from src.models.database import MessageCreate, Thread, ThreadCreate
 from src.models.domain import MessageFromLLM, MessageFromTelethon
 from src.models.enums import SenderType
@@ -23,6 +23,7 @@ class MessageService:
         message_repository: MessageRepository,
         chat_repository: ChatRepository,
         thread_repository: ThreadRepository,
+        thread_index: ThreadIndex,
         openai_client: AsyncOpenAI,
         logger: structlog.typing.FilteringBoundLogger,
     ) -> None:
@@ -31,6 +32,7 @@ class MessageService:
         self.message_repository = message_repository
         self.chat_repository = chat_repository
         self.thread_repository = thread_repository
+        self.thread_index = thread_index
         self.openai_client = openai_client
         self.logger = logger
 
@@ -140,6 +142,11 @@ class MessageService:
             parent_message_id=parent_message_id,
         )
         message = await self.message_repository.create(message_user)
+        self.thread_index.put(
+            message_model.chat_id,
+            message_model.telegram_message_id,
+            thread_id,
+        )
         return message.id
 
     async def _get_formatted_message_history(
@@ -188,6 +195,7 @@ class MessageService:
             thread_id=thread_id,
         )
         await self.message_repository.create(message_bot)
+        self.thread_index.put(message_model.chat_id, sent_msg.id, thread_id)
         self.logger.info(
             "message_answered",
             user_id=message_model.user_id,